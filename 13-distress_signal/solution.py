@@ -1,26 +1,102 @@
-import re
+from ast import literal_eval
+import json
+import os
+import random
+import tempfile
+from timeit import timeit
 
 import pyperclip
 import functools
 
+import nested_lists
 from option_selection import OptionSelector
 from testing import test_bed
 
 
 def read(path: str) -> list:
-    with open(path, 'r') as f:
-        return [tuple(eval(y) for y in x.split('\n')) for x in f.read().rstrip().split('\n\n')]
+    packets = read_flat(path)
+    if len(packets) % 2:
+        raise ValueError(f'{path} holds {len(packets)} packets, which cannot be split into pairs')
+    return list(zip(packets[::2], packets[1::2]))
 
 
 def read_flat(path: str) -> list:
+    return nested_lists.parse_file(path)
+
+
+def read_with_eval(path: str) -> list:
+    """Read the packets with eval(), as read() did before nested_lists was used"""
     with open(path, 'r') as f:
-        return [eval(x) for x in re.split(r'\n+', f.read().rstrip())]
+        return [tuple(eval(y) for y in x.split('\n')) for x in f.read().rstrip().split('\n\n')]
 
 
 def test_read():
     print(read('test.txt'))
 
 
+def random_packet(rng: random.Random, depth: int = 0) -> list:
+    """Generate a random packet, with lists nested up to 5 deep"""
+    return [random_packet(rng, depth + 1) if depth < 5 and rng.random() < 0.3 else rng.randrange(11)
+            for _ in range(rng.randrange(6))]
+
+
+def write_random_packets(path: str, pairs: int, seed: int = 0):
+    """Write a file of random packet pairs, in the same format as the puzzle input"""
+    rng = random.Random(seed)
+    with open(path, 'w') as f:
+        f.write('\n\n'.join(f'{random_packet(rng)}\n{random_packet(rng)}'.replace(' ', '') for _ in range(pairs)))
+
+
+def test_read_against_eval():
+    with tempfile.TemporaryDirectory() as directory:
+        paths = ['test.txt', 'input.txt']
+        for seed in range(3):
+            paths.append(path := os.path.join(directory, f'packets_{seed}.txt'))
+            write_random_packets(path, 1000, seed)
+        test_bed(read, paths, [read_with_eval(x) for x in paths])
+        # A file with an unpaired packet
+        path = os.path.join(directory, 'unpaired.txt')
+        with open(path, 'w') as f:
+            f.write('[1]\n[2]\n\n[3]\n')
+        try:
+            read(path)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('read() accepted an unpaired packet')
+
+    def parse_error(text: str):
+        try:
+            nested_lists.parse_all(text)
+        except ValueError:
+            return 'ValueError'
+
+    # Malformed packets, with missing, doubled or stray commas, bare integers and unbalanced brackets
+    malformed = ['[1 2]', '[1,,2]', '[[]1]', '[1]2', '[,1]', '[1,]', '1', '[1,2]]', '[[1]', '[1,a]']
+    test_bed(parse_error, malformed, ['ValueError'] * len(malformed))
+
+
+def benchmark_read():
+    """Compare parsing packets with nested_lists against eval(), ast.literal_eval() and json.loads()"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'packets.txt')
+        for pairs in (10 ** 4, 10 ** 5):
+            write_random_packets(path, pairs)
+            with open(path, 'r') as f:
+                lines = [x for x in f.read().split('\n') if x]
+            print(f'{len(lines)} packets, {os.path.getsize(path) / 2 ** 20:.1f} MiB')
+            parsers = {
+                'eval': lambda: [eval(x) for x in lines],
+                'literal_eval': lambda: [literal_eval(x) for x in lines],
+                'json.loads': lambda: [json.loads(x) for x in lines],
+                'nested_lists.parse': lambda: [nested_lists.parse(x) for x in lines],
+                'nested_lists.parse_file': lambda: nested_lists.parse_file(path),
+            }
+            for name, parse in parsers.items():
+                time = timeit(parse, number=1)
+                print(f'  {name:>23} {time:>8.4f} s {len(lines) / time:>10.0f} packets/s')
+
+
 def in_right_order(left_value: list | int, right_value: list | int) -> bool | None:
     """
     Check if the packet pair is in the right order
@@ -127,10 +203,12 @@ def main():
     selector.add_option('1', 'part 1', part_1)
     selector.add_option('2', 'part 2', part_2)
     selector.add_option('tr', 'test read', test_read)
+    selector.add_option('te', 'test read against eval', test_read_against_eval)
     selector.add_option('ti', 'test in_right_order', test_in_right_order)
     selector.add_option('ts', 'test sum_indices_of_properly_ordered_packets', test_sum_indices)
     selector.add_option('to', 'test packet ordering', test_order_packets)
     selector.add_option('td', 'test finding decoder key', test_get_decoder_key)
+    selector.add_option('br', 'benchmark read', benchmark_read)
     selector.run()
 
 
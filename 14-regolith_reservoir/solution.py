@@ -1,16 +1,28 @@
+import os
+import random
+from array import array
+from bisect import bisect_right
+import struct
+import sys
+import tempfile
+import tracemalloc
+from timeit import timeit
+
+import numpy as np
+import numpy.typing as npt
 import pyperclip
 
-from magic_matrix import MagicMatrix
+from magic_matrix import ChunkedMagicMatrix, Coordinate2D, MagicMatrix, ROW_STEP, pack, unpack
 from option_selection import OptionSelector
 from testing import test_bed
 from collections import deque
-from typing import Deque
+from typing import BinaryIO, Deque, Iterator
 
 
-def read(path: str):
+def read(path: str, matrix_type: type[MagicMatrix] = MagicMatrix, occupancy_index: bool = False):
     with open(path, 'r') as f:
         lines = [[[int(z) for z in y.split(',')] for y in x.split(' -> ')] for x in f.read().rstrip().split('\n')]
-    grid = MagicMatrix()
+    grid = matrix_type(occupancy_index=occupancy_index)
     for i in range(len(lines)):
         for j in range(1, len(lines[i])):
             for y in range(min(lines[i][j - 1][1], lines[i][j][1]), max(lines[i][j - 1][1], lines[i][j][1]) + 1):
@@ -23,6 +35,213 @@ def test_read():
     print(read('in_1.txt'))
 
 
+def test_matrix_column_limit():
+    """Check that columns outside the packed range are rejected rather than aliasing other cells"""
+    def set_then_get(matrix_type: type[MagicMatrix], col: int):
+        matrix = matrix_type()
+        matrix[1, 0] = 'a'
+        try:
+            matrix[0, col] = 'b'
+        except ValueError:
+            return 'rejected', matrix[0, col], matrix.get(0, col), matrix.get_many([0], [col]), sorted(matrix.items())
+        return 'stored', matrix[0, col], matrix.get(0, col), matrix.get_many([0], [col]), sorted(matrix.items())
+
+    inputs = [(matrix_type, col) for matrix_type in (MagicMatrix, ChunkedMagicMatrix)
+              for col in (2 ** 32, -2 ** 31 - 1, 2 ** 31 - 1, -2 ** 31)]
+    expected = [('rejected', None, None, [None], [((1, 0), 'a')]) if col in (2 ** 32, -2 ** 31 - 1) else
+                ('stored', 'b', 'b', ['b'], sorted([((0, col), 'b'), ((1, 0), 'a')])) for _, col in inputs]
+    test_bed(set_then_get, inputs, expected)
+
+
+EMPTY = 0
+ROCK = 1
+SAND = 2
+
+
+def read_dense(path: str, infinite_floor: bool = False) -> tuple[npt.NDArray[np.uint8], int]:
+    """
+    Read a slice of the cave into a dense array instead of a MagicMatrix. Every rock path is parsed in one pass into
+    arrays of segment end points, and all the segments are rasterised at once, so no Python code runs per rock cell.
+
+    Row y of the array is y in the cave, and there are rows down to the floor, two rows below the lowest rock. Column j
+    is x = j + x_offset in the cave. The columns cover all the rock and every space that sand could reach above the
+    floor, plus one more on each side, so a unit of sand can always look down and to either side
+    :param path: Path to a file containing data about the slice of the cave
+    :param infinite_floor: If true, the floor row is filled with rock
+    :return: tuple containing the array, with cells set to EMPTY or ROCK, and the x offset
+    """
+    with open(path, 'r') as f:
+        text = f.read().rstrip()
+    points_per_path = np.array([line.count('->') + 1 for line in text.split('\n')])
+    points = np.fromstring(text.replace(' -> ', ',').replace('\n', ','), dtype=np.int64, sep=',').reshape(-1, 2)
+    # A segment joins each point to the next, except for the last point of each path
+    is_start = np.ones(len(points) - 1, bool)
+    is_start[np.cumsum(points_per_path)[:-1] - 1] = False
+    starts = points[:-1][is_start]
+    ends = points[1:][is_start]
+
+    floor = int(points[:, 1].max()) + 2
+    x_offset = min(int(points[:, 0].min()), 500 - floor) - 1
+    width = max(int(points[:, 0].max()), 500 + floor) + 2 - x_offset
+    cave = np.zeros((floor + 1, width), np.uint8)
+    if infinite_floor:
+        cave[floor] = ROCK
+
+    # Every segment is horizontal or vertical, so it has max(|dx|, |dy|) + 1 cells
+    steps = np.sign(ends - starts)
+    lengths = np.abs(ends - starts).max(axis=1) + 1
+    segment = np.repeat(np.arange(len(lengths)), lengths)
+    position = np.arange(len(segment)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    cells = starts[segment] + steps[segment] * position[:, np.newaxis]
+    cave[cells[:, 1], cells[:, 0] - x_offset] = ROCK
+    return cave, x_offset
+
+
+def fill_dense_with_sand(cave: npt.NDArray[np.uint8], x_offset: int, infinite_floor: bool = False) -> int:
+    """
+    Fill a cave read by read_dense() with sand, in the same way as fast_fill_with_sand(). The array is treated as one
+    flat buffer, so moving down a row is adding the row width to an index. The cave is modified in place
+    :param cave: Slice of the cave, as returned by read_dense()
+    :param x_offset: x offset of the cave, as returned by read_dense()
+    :param infinite_floor: If true, the cave must have been read with its floor filled with rock. Otherwise, sand that
+    falls below the lowest rock falls into the abyss
+    :return: An integer representing the number of units of sand that came to rest
+    """
+    height, width = cave.shape
+    cells = memoryview(cave).cast('B')
+    # Sand that reaches the row below the lowest rock can only fall into the abyss (or onto the floor)
+    abyss = (height - 2) * width
+    sand = 0
+    sand_path = [500 - x_offset]
+    while sand_path:
+        i = sand_path[-1]
+        if cells[i]:  # End of path is blocked; start from the previous space in the path
+            sand_path.pop()
+            continue
+        while True:
+            below = i + width
+            if below >= abyss and not infinite_floor:
+                return sand  # fall into the abyss
+            elif not cells[below]:
+                i = below
+            elif not cells[below - 1]:
+                i = below - 1  # fall down and left
+            elif not cells[below + 1]:
+                i = below + 1  # fall down and right
+            else:
+                cells[i] = SAND
+                sand += 1
+                break
+            sand_path.append(i)
+    return sand  # the entry point is blocked
+
+
+def dense_fill_with_sand(path: str, infinite_floor: bool = False) -> int:
+    """
+    Same as fast_fill_with_sand(), but the cave is read with read_dense() and simulated with fill_dense_with_sand()
+    :param path: Path to a file containing data about the slice of the cave where sand is to be dropped
+    :param infinite_floor: If true, the simulation will be run with an infinite floor
+    :return: An integer representing the number of units of sand that came to rest
+    """
+    return fill_dense_with_sand(*read_dense(path, infinite_floor), infinite_floor)
+
+
+class SandTrace:
+    """
+    Records a sand simulation as a stream of frames in a compact binary file, so it can be inspected later with
+    replay_trace() without running it again or storing a full picture of the cave for each frame.
+
+    The file starts with a header, followed by one record per frame. Each record holds the number of units of sand that
+    had come to rest by the end of the frame and the cells that changed during it, as pairs of little-endian 32-bit
+    (y, x) values. Frame 0 holds the rock; each frame after that holds the sand that came to rest since the last one
+    """
+    MAGIC = b'SAND'
+    HEADER = struct.Struct('<4sI')  # magic, grains per frame
+    RECORD = struct.Struct('<QI')  # units of sand at rest, number of cells
+
+    def __init__(self, sink: BinaryIO, cave: MagicMatrix, every: int = 1):
+        """
+        Start a trace, writing the header and the rock in the cave as frame 0
+        :param sink: Binary file the trace is written to
+        :param cave: Slice of the cave, as returned by read(), before any sand is dropped
+        :param every: Number of units of sand that come to rest between frames
+        """
+        if every < 1:
+            raise ValueError(f'every must be at least 1, got {every}')
+        self.__sink = sink
+        self.__every = every
+        self.__sand = 0
+        self.__pending = []
+        sink.write(self.HEADER.pack(self.MAGIC, every))
+        self.__write_frame(pack(y, x) for y, x in cave.keys())
+
+    def __write_frame(self, keys):
+        cells = array('i')
+        for key in keys:
+            cells.extend(unpack(key))
+        if sys.byteorder == 'big':
+            cells.byteswap()
+        self.__sink.write(self.RECORD.pack(self.__sand, len(cells) // 2))
+        self.__sink.write(cells.tobytes())
+
+    def record(self, key: int):
+        """
+        Record a unit of sand coming to rest, writing a frame if enough have come to rest since the last one
+        :param key: Space where the sand came to rest, as a packed key
+        """
+        self.__sand += 1
+        self.__pending.append(key)
+        if len(self.__pending) == self.__every:
+            self.flush()
+
+    def flush(self):
+        """Write any sand that has come to rest since the last frame as a final, shorter frame"""
+        if self.__pending:
+            self.__write_frame(self.__pending)
+            self.__pending.clear()
+
+
+def read_trace(source: BinaryIO) -> Iterator[tuple[int, list[Coordinate2D]]]:
+    """
+    Read the frames in a trace written by SandTrace
+    :param source: Binary file containing the trace
+    :return: Generator of tuples containing the number of units of sand at rest by the end of each frame and the cells
+    that changed during it
+    """
+    magic, every = SandTrace.HEADER.unpack(source.read(SandTrace.HEADER.size))
+    if magic != SandTrace.MAGIC:
+        raise ValueError('not a sand trace')
+    while header := source.read(SandTrace.RECORD.size):
+        sand, count = SandTrace.RECORD.unpack(header)
+        cells = array('i')
+        cells.frombytes(source.read(count * 8))
+        if sys.byteorder == 'big':
+            cells.byteswap()
+        yield sand, list(zip(cells[::2], cells[1::2]))
+
+
+def replay_trace(path: str, frame: int | None = None, matrix_type: type[MagicMatrix] = MagicMatrix) -> MagicMatrix:
+    """
+    Rebuild the cave as it was at the end of a frame of a trace written by SandTrace
+    :param path: Path to the trace
+    :param frame: Index of the frame. Frame 0 is the rock before any sand was dropped. If None, the last frame is used
+    :param matrix_type: Type of MagicMatrix used to store the cave
+    :return: The cave, with rock marked '#' and sand marked 'o'
+    """
+    cave = matrix_type()
+    with open(path, 'rb') as f:
+        for i, (_, cells) in enumerate(read_trace(f)):
+            value = 'o' if i else '#'
+            for y, x in cells:
+                cave.set(y, x, value)
+            if i == frame:
+                break
+        else:
+            if frame is not None:
+                raise IndexError(f'trace has no frame {frame}')
+    return cave
+
+
 def drop_sand(grid: MagicMatrix) -> bool:
     """
     Simulate dropping a unit of sand from the position (500,0).
@@ -36,7 +255,7 @@ def drop_sand(grid: MagicMatrix) -> bool:
     x = 500
     y = 0
     while True:
-        if y == grid.extents()[3]:
+        if y == grid.extents()[2]:
             return False  # fall into the abyss
         elif grid[y + 1, x] is None:
             pass    # fall straight down
@@ -62,11 +281,11 @@ def fill_with_sand(path: str, show_picture: bool = False) -> int:
     while drop_sand(cave):
         pass
     if show_picture:
-        print(cave)
+        cave.write_text(sys.stdout)
     return len(cave) - rocks  # len is now equal to the number of rock spaces plus sand spaces
 
 
-def fast_drop_sand(grid: MagicMatrix, max_y: int, sand_path: Deque[tuple[int, int]], infinite_floor: bool = False):
+def fast_drop_sand(grid: MagicMatrix, max_y: int, sand_path: Deque[int], infinite_floor: bool = False):
     """
     Simulate dropping a unit of sand from the position (500,0).
 
@@ -75,43 +294,66 @@ def fast_drop_sand(grid: MagicMatrix, max_y: int, sand_path: Deque[tuple[int, in
     A unit of sand first attempts to fall down one space. If the space below is blocked, it attempts to fall down and to
     the left one space. If that space is blocked, it attempts to fall down and to the right one space. If that space is
     blocked, the unit of sand stops moving. This repeats until the unit of sand either stops moving or falls into the
-    abyss. This version reduces time complexity by caching the path taken by units of sand to avoid repeating work
+    abyss. This version reduces time complexity by caching the path taken by units of sand to avoid repeating work. It
+    also walks the grid with packed keys, so no tuple is built for each lookup. If the grid has an occupancy index, it
+    is used to find where the sand falls instead of testing each cell
     :param grid: Represents a slice of the cave, including all stone and all sand that has previously fallen
     :param max_y: maximum y position for a grain of sand.
-    :param sand_path: Used as a stack containing the path previous units of sand took to get to this space
+    :param sand_path: Used as a stack containing the path previous units of sand took to get to this space, as packed
+    keys. The path moves down one row per step, so the y position of the last space is always len(sand_path) - 1
     :param infinite_floor: If True, the simulation will treat max_y as the lowest empty space above an infinite floor.
     If False, max_y will be treated as the lowest point above an abyss
     :return: True if the sand came to rest, False if it fell into the abyss or the sand drop point was blocked
     """
+    get = grid.get_packed
     # Optimization to avoid repeating work
-    start_point = sand_path[-1]
-    if grid[start_point] is not None:  # End of path is blocked; attempt to start from the previous space in the path
+    key = sand_path[-1]
+    if get(key) is not None:  # End of path is blocked; attempt to start from the previous space in the path
         sand_path.pop()
         if len(sand_path) == 0:  # Start of path is blocked; no more sand can be spawned
             return False
-        start_point = sand_path[-1]
-    (y, x) = start_point
+        key = sand_path[-1]
+    y = len(sand_path) - 1
+
+    if grid.has_occupancy_index:
+        first_free_below = grid.first_free_below
+        x = unpack(key)[1]
+        while True:
+            if y == max_y:
+                if infinite_floor:
+                    grid.set(y, x, 'o')
+                    return True
+                return False
+            if (next_x := first_free_below(y, x)) is None:
+                grid.set(y, x, 'o')
+                return True
+            x = next_x
+            y += 1
+            sand_path.append(pack(y, x))
 
     while True:
+        below = key + ROW_STEP
         if y == max_y:
             if infinite_floor:
-                grid[y, x] = 'o'
+                grid.set_packed(key, 'o')
                 return True
             return False
-        elif grid[y + 1, x] is None:
-            pass
-        elif grid[y + 1, x - 1] is None:
-            x -= 1  # fall down and left
-        elif grid[y + 1, x + 1] is None:
-            x += 1  # fall down and right
+        elif get(below) is None:
+            key = below
+        elif get(below - 1) is None:
+            key = below - 1  # fall down and left
+        elif get(below + 1) is None:
+            key = below + 1  # fall down and right
         else:
-            grid[y, x] = 'o'
+            grid.set_packed(key, 'o')
             return True
         y += 1
-        sand_path.append((y, x))
+        sand_path.append(key)
 
 
-def fast_fill_with_sand(path: str, infinite_floor: bool = False, show_picture: bool = False):
+def fast_fill_with_sand(path: str, infinite_floor: bool = False, show_picture: bool = False,
+                        matrix_type: type[MagicMatrix] = MagicMatrix, occupancy_index: bool = False,
+                        engine: str = 'step', trace_path: str | None = None, trace_every: int = 1):
     """
     Repeatedly drop sand, one unit at a time, until a unit of sand falls into the abyss or the entry point is blocked.
 
@@ -120,21 +362,198 @@ def fast_fill_with_sand(path: str, infinite_floor: bool = False, show_picture: b
     :param path: Path to a file containing data about the slice of the cave where sand is to be dropped
     :param infinite_floor: If true, the simulation will be run with an infinite floor
     :param show_picture: If true, a picture of the cave will be shown at the end
+    :param matrix_type: Type of MagicMatrix used to store the cave
+    :param occupancy_index: If true, the cave keeps an occupancy index, which is used to find where the sand falls
+    :param engine: Name of the engine used to simulate the sand. See SAND_ENGINES
+    :param trace_path: If given, the simulation is traced to a file at this path. See SandTrace
+    :param trace_every: Number of units of sand that come to rest between frames of the trace
     :return:
     """
-    cave = read(path)
-    rocks = len(cave)  # No sand has been dropped, so len is equal to the number of rock spaces
-    sand_path = deque([(0, 500)])
+    cave = read(path, matrix_type, occupancy_index)
+    if trace_path is None:
+        result = fill_cave_with_sand(cave, infinite_floor, engine)
+    else:
+        with open(trace_path, 'wb') as f:
+            trace = SandTrace(f, cave, trace_every)
+            result = fill_cave_with_sand(cave, infinite_floor, engine, trace)
+            trace.flush()
+    if show_picture:
+        cave.write_text(sys.stdout)
+    return result
+
+
+def fill_cave_with_sand(cave: MagicMatrix, infinite_floor: bool = False, engine: str = 'step',
+                        trace: SandTrace | None = None) -> int:
+    """
+    Fill an already parsed cave with sand, in the same way as fast_fill_with_sand(). The cave is modified in place; fork
+    it first to keep the original
+    :param cave: Slice of the cave, as returned by read()
+    :param infinite_floor: If true, the simulation will be run with an infinite floor
+    :param engine: Name of the engine used to simulate the sand. See SAND_ENGINES
+    :param trace: If given, each unit of sand that comes to rest is recorded in this trace
+    :return: An integer representing the number of units of sand that came to rest
+    """
+    return SAND_ENGINES[engine](cave, infinite_floor, trace)
+
+
+def fill_cave_stepwise(cave: MagicMatrix, infinite_floor: bool = False, trace: SandTrace | None = None) -> int:
+    """
+    Fill a cave with sand using fast_drop_sand(), moving each unit of sand one row at a time along the cached path
+    :param cave: Slice of the cave, as returned by read()
+    :param infinite_floor: If true, the simulation will be run with an infinite floor
+    :param trace: If given, each unit of sand that comes to rest is recorded in this trace
+    :return: An integer representing the number of units of sand that came to rest
+    """
+    rocks = len(cave)  # Assuming no sand has been dropped, len is equal to the number of rock spaces
+    sand_path = deque([pack(0, 500)])
     max_y = cave.extents()[2]
     if infinite_floor:
         max_y += 1
-    while fast_drop_sand(cave, max_y, sand_path, infinite_floor):
-        pass
-    if show_picture:
-        print(cave)
+    if trace is None:
+        while fast_drop_sand(cave, max_y, sand_path, infinite_floor):
+            pass
+    else:
+        # Sand always comes to rest at the end of the path, so the trace is kept out of the inner loop
+        while fast_drop_sand(cave, max_y, sand_path, infinite_floor):
+            trace.record(sand_path[-1])
     return len(cave) - rocks  # len is now equal to the number of rock spaces plus sand spaces
 
 
+def fill_cave_skyline(cave: MagicMatrix, infinite_floor: bool = False, trace: SandTrace | None = None) -> int:
+    """
+    Fill a cave with sand using a skyline index. For each column, the blocked rows are kept as sorted runs of
+    consecutive rows. Instead of moving one row at a time, a unit of sand jumps straight to the space above the next
+    run in its column, then tries to slide down and to the left or right. When it comes to rest, it just extends the
+    run it landed on upwards. This makes the cost of each unit of sand depend on the number of obstacles it passes
+    rather than the distance it falls, which pays off in tall, sparse caves. Like fast_drop_sand(), it caches the path
+    taken by the last unit of sand, here as the points where it started each jump
+    :param cave: Slice of the cave, as returned by read()
+    :param infinite_floor: If true, the simulation will be run with an infinite floor two rows below the lowest rock
+    :param trace: If given, each unit of sand that comes to rest is recorded in this trace
+    :return: An integer representing the number of units of sand that came to rest
+    """
+    # Column -> (first row of each run, last row of each run)
+    columns: dict[int, tuple[list[int], list[int]]] = {}
+    rock_rows: dict[int, list[int]] = {}
+    for y, x in cave.keys():
+        rock_rows.setdefault(x, []).append(y)
+    for x, rows in rock_rows.items():
+        rows.sort()
+        tops, bottoms = columns[x] = [rows[0]], [rows[0]]
+        for y in rows[1:]:
+            if y == bottoms[-1] + 1:
+                bottoms[-1] = y
+            else:
+                tops.append(y)
+                bottoms.append(y)
+    floor = cave.extents()[2] + 2 if infinite_floor else None
+    no_runs = ([], [])
+
+    def blocked(y: int, x: int) -> bool:
+        if y == floor:
+            return True
+        tops, bottoms = columns.get(x, no_runs)
+        i = bisect_right(tops, y) - 1
+        return i >= 0 and bottoms[i] >= y
+
+    sand = 0
+    sand_path = [(0, 500)]
+    while True:
+        # Only the end of the path can have been blocked by the last unit of sand
+        while sand_path and blocked(*sand_path[-1]):
+            sand_path.pop()
+        if not sand_path:
+            return sand  # the entry point is blocked
+        y, x = sand_path[-1]
+        while True:
+            # Jump to the next run in this column. (y, x) is free, so that is the first run starting below y
+            tops, bottoms = columns.get(x, no_runs)
+            i = bisect_right(tops, y)
+            if i < len(tops):
+                obstacle = tops[i]
+            elif floor is not None:
+                obstacle = floor
+            else:
+                return sand  # fall into the abyss
+            if not blocked(obstacle, x - 1):
+                y, x = obstacle, x - 1  # fall down and left
+            elif not blocked(obstacle, x + 1):
+                y, x = obstacle, x + 1  # fall down and right
+            else:
+                break
+            sand_path.append((y, x))
+        # Come to rest on top of the run, merging it with the run above if they now touch
+        y = obstacle - 1
+        if i == len(tops):  # resting on the floor
+            if x not in columns:
+                tops, bottoms = columns[x] = ([], [])
+            tops.append(y)
+            bottoms.append(y)
+        elif i > 0 and bottoms[i - 1] == y - 1:
+            bottoms[i - 1] = bottoms[i]
+            del tops[i], bottoms[i]
+        else:
+            tops[i] = y
+        cave.set(y, x, 'o')
+        sand += 1
+        if trace is not None:
+            trace.record(pack(y, x))
+
+
+# Engines that fill_cave_with_sand() can use to simulate the sand
+SAND_ENGINES = {
+    'step': fill_cave_stepwise,
+    'skyline': fill_cave_skyline,
+}
+
+
+def count_sand_by_rows(cave: MagicMatrix) -> int:
+    """
+    Count the units of sand that come to rest above an infinite floor without simulating them. Once the entry point is
+    blocked, sand fills exactly the spaces that can be reached from (500,0) by moving down, down and to the left, or
+    down and to the right without passing through rock. So the sand in each row is the sand in the row above, spread
+    one space to each side, minus the rock in that row. Each row is an int bitmask, so a row costs a few big-int
+    operations instead of one step per unit of sand
+    :param cave: Slice of the cave, as returned by read(). It is not modified
+    :return: An integer representing the number of units of sand that come to rest
+    """
+    floor = cave.extents()[2] + 2
+    # Sand can spread at most one space left per row, so nothing reachable is left of 500 - floor
+    offset = 500 - floor
+    rock: dict[int, int] = {}
+    for y, x in cave.keys():
+        if x >= offset:
+            rock[y] = rock.get(y, 0) | 1 << (x - offset)
+
+    sand = 1 << (500 - offset) & ~rock.get(0, 0)
+    total = sand.bit_count()
+    for y in range(1, floor):
+        sand = (sand | sand << 1 | sand >> 1) & ~rock.get(y, 0)
+        total += sand.bit_count()
+    return total
+
+
+def fill_with_sand_by_rows(path: str) -> int:
+    """
+    Solve part 2 with count_sand_by_rows() instead of simulating the sand
+    :param path: Path to a file containing data about the slice of the cave where sand is to be dropped
+    :return: An integer representing the number of units of sand that come to rest above the infinite floor
+    """
+    return count_sand_by_rows(read(path))
+
+
+def fill_with_sand_both_parts(path: str, matrix_type: type[MagicMatrix] = MagicMatrix) -> tuple[int, int]:
+    """
+    Solve both parts from a single parse of the cave. Each simulation runs on a fork of the parsed cave, so the rock
+    is never copied until the sand is dropped on it
+    :param path: Path to a file containing data about the slice of the cave where sand is to be dropped
+    :param matrix_type: Type of MagicMatrix used to store the cave
+    :return: Units of sand that came to rest with an abyss below the cave, then with an infinite floor
+    """
+    cave = read(path, matrix_type)
+    return fill_cave_with_sand(cave.fork()), fill_cave_with_sand(cave.fork(), True)
+
+
 def test_fill_with_sand():
     test_bed(fill_with_sand, (('in_1.txt', True),), (24,))
 
@@ -144,6 +563,224 @@ def test_fast_fill_with_sand():
     test_bed(fast_fill_with_sand, ((path, False, True), (path, True, True)), (24, 93))
 
 
+def test_fast_fill_with_sand_occupancy_index():
+    path = 'in_1.txt'
+    inputs = []
+    for matrix_type in (MagicMatrix, ChunkedMagicMatrix):
+        inputs += [(path, False, False, matrix_type, True), (path, True, False, matrix_type, True)]
+    test_bed(fast_fill_with_sand, inputs, (24, 93) * 2)
+    # Free cells of the bottom rock row of the example, including empty and reversed ranges
+    cave = read(path, occupancy_index=True)
+    test_bed(cave.free_cells, [(9, 492, 504), (9, 494, 494), (9, 500, 495)], [[492, 493, 503], [], []])
+
+
+def test_fill_with_sand_both_parts():
+    path = 'in_1.txt'
+    test_bed(fill_with_sand_both_parts, ((path, MagicMatrix), (path, ChunkedMagicMatrix)), ((24, 93), (24, 93)))
+
+
+def test_dense_fill_with_sand():
+    """Check the dense loader and simulator against the MagicMatrix simulator on the example and generated caves"""
+    with tempfile.TemporaryDirectory() as directory:
+        paths = ['in_1.txt']
+        for seed in range(4):
+            paths.append(path := os.path.join(directory, f'cave_{seed}.txt'))
+            generate_cave(path, 20 + 20 * seed, 40 + 30 * seed, 10 + 10 * seed, seed)
+        inputs = [(x, y) for x in paths for y in (False, True)]
+        test_bed(dense_fill_with_sand, inputs, [fast_fill_with_sand(*x) for x in inputs])
+
+
+def test_sand_trace():
+    """Check that replaying each frame of a trace rebuilds the cave as it was at that point in the simulation"""
+    def replay_frames(path: str, infinite_floor: bool, engine: str, every: int) -> list[int]:
+        trace_path = os.path.join(directory, 'trace.bin')
+        fast_fill_with_sand(path, infinite_floor, engine=engine, trace_path=trace_path, trace_every=every)
+        with open(trace_path, 'rb') as f:
+            frames = [sand for sand, _ in read_trace(f)]
+        # Every frame must hold all of the rock plus exactly the sand counted so far
+        rocks = len(read(path))
+        assert all(len(replay_trace(trace_path, i)) == rocks + sand for i, sand in enumerate(frames))
+        # The last frame must match the cave at the end of the simulation
+        cave = read(path)
+        fill_cave_with_sand(cave, infinite_floor, engine)
+        assert str(replay_trace(trace_path)) == str(cave)
+        return frames
+
+    with tempfile.TemporaryDirectory() as directory:
+        inputs = [('in_1.txt', False, 'step', 5), ('in_1.txt', True, 'step', 10), ('in_1.txt', True, 'skyline', 1),
+                  ('input.txt', True, 'step', 1000), ('input.txt', False, 'skyline', 100)]
+        test_bed(replay_frames, inputs, [[0, 5, 10, 15, 20, 24], [0] + list(range(10, 100, 10)) + [93],
+                                         list(range(94)), [0] + list(range(1000, 28000, 1000)) + [27623],
+                                         [0] + list(range(100, 800, 100)) + [728]])
+
+
+def test_sand_engines():
+    path = 'in_1.txt'
+    inputs = []
+    for engine in SAND_ENGINES:
+        inputs += [(path, False, False, MagicMatrix, False, engine), (path, True, False, MagicMatrix, False, engine)]
+    test_bed(fast_fill_with_sand, inputs, (24, 93) * len(SAND_ENGINES))
+
+
+def test_fill_with_sand_by_rows():
+    """Check the row-propagation solver against the simulator on the example and on generated caves"""
+    with tempfile.TemporaryDirectory() as directory:
+        inputs = ['in_1.txt']
+        for seed in range(8):
+            inputs.append(path := os.path.join(directory, f'cave_{seed}.txt'))
+            generate_cave(path, 20 + 20 * seed, 40 + 30 * seed, 10 + 10 * seed, seed, basin=seed % 2 == 0)
+        test_bed(fill_with_sand_by_rows, inputs, [fast_fill_with_sand(x, True) for x in inputs])
+
+
+def generate_cave(path: str, width: int, depth: int, rock_paths: int, seed: int = 0, basin: bool = True):
+    """
+    Write a randomly generated slice of the cave to a file, in the same format as the puzzle input. Rock paths are
+    made of alternating horizontal and vertical segments, placed below the sand entry point at (500,0)
+    :param path: Path of the file to write
+    :param width: Width of the region around x=500 in which rock is placed
+    :param depth: Greatest y position of any rock
+    :param rock_paths: Number of rock paths to generate
+    :param seed: Seed for the random number generator, so that the same arguments always give the same cave
+    :param basin: If true, a U-shaped basin spanning the whole width is added at the bottom, so that a large amount of
+    sand comes to rest before any falls into the abyss
+    :return: None
+    """
+    rng = random.Random(seed)
+    left = 500 - width // 2
+    right = 500 + width // 2
+    top = max(2, depth // 4)
+    # Keep segments short compared to the distance from the entry point, so sand cannot pile up high enough to block it
+    max_segment = max(2, min(width, depth) // 10)
+    lines = []
+    for _ in range(rock_paths):
+        x = rng.randint(left, right)
+        y = rng.randint(top, depth)
+        points = [(x, y)]
+        for i in range(rng.randint(1, 4)):
+            if i % 2 == 0:
+                x = min(right, max(left, x + rng.randint(-max_segment, max_segment)))
+            else:
+                y = min(depth, max(top, y + rng.randint(-max_segment, max_segment)))
+            points.append((x, y))
+        lines.append(' -> '.join(f'{px},{py}' for px, py in points))
+    # The walls of the basin must be low enough for the sand to spill over them before it piles up to the entry point
+    if basin and (wall_top := max(depth // 2, 3 * width // 4)) <= depth:
+        lines.append(f'{left},{wall_top} -> {left},{depth} -> {right},{depth} -> {right},{wall_top}')
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def benchmark_fill_with_sand():
+    """Time fill_with_sand on generated caves of increasing size"""
+    print(f'{"width":>6} {"depth":>6} {"sand":>8} {"time (s)":>10}')
+    with tempfile.TemporaryDirectory() as directory:
+        for size in (20, 40, 80, 160, 320, 640):
+            path = os.path.join(directory, f'cave_{size}.txt')
+            generate_cave(path, size // 2, size, size // 2)
+            result = 0
+
+            def run():
+                nonlocal result
+                result = fill_with_sand(path)
+
+            time = timeit(run, number=1)
+            print(f'{size // 2:>6} {size:>6} {result:>8} {time:>10.4f}')
+
+
+def benchmark_matrix_types():
+    """Compare the memory use and speed of the MagicMatrix backends on a cave that fills with over a million units of
+    sand"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'cave.txt')
+        generate_cave(path, 800, 1700, 800)
+        print(f'{"backend":>20} {"sand":>9} {"peak memory (MB)":>17} {"time (s)":>10}')
+        for matrix_type in (MagicMatrix, ChunkedMagicMatrix):
+            result = 0
+
+            def run():
+                nonlocal result
+                result = fast_fill_with_sand(path, True, matrix_type=matrix_type)
+
+            time = timeit(run, number=1)
+            tracemalloc.start()
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f'{matrix_type.__name__:>20} {result:>9} {peak / 2 ** 20:>17.1f} {time:>10.4f}')
+
+
+def benchmark_sand_engines():
+    """Compare the sand engines on tall, sparse caves, where sand falls a long way between obstacles"""
+    print(f'{"width":>6} {"depth":>8} {"rock paths":>10} {"engine":>8} {"sand":>6} {"time (s)":>10}')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'cave.txt')
+        for width, depth, rock_paths in ((40, 10 ** 4, 20), (40, 10 ** 5, 200), (40, 10 ** 6, 2000),
+                                         (200, 10 ** 5, 2000), (200, 10 ** 6, 20000)):
+            generate_cave(path, width, depth, rock_paths, basin=False)
+            cave = read(path)
+            for engine in SAND_ENGINES:
+                result = 0
+
+                def run():
+                    nonlocal result
+                    result = fill_cave_with_sand(cave.fork(), False, engine)
+
+                time = timeit(run, number=1)
+                print(f'{width:>6} {depth:>8} {rock_paths:>10} {engine:>8} {result:>6} {time:>10.4f}')
+
+
+def benchmark_fill_with_sand_by_rows():
+    """Compare the simulator and the row-propagation solver for part 2"""
+    print(f'{"width":>6} {"depth":>6} {"sand":>9} {"simulated (s)":>14} {"by rows (s)":>12}')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'cave.txt')
+        for size in (100, 200, 400, 800):
+            generate_cave(path, size // 2, size, size // 2)
+            cave = read(path)
+            result = 0
+
+            def simulate():
+                nonlocal result
+                result = fill_cave_with_sand(cave.fork(), True)
+
+            simulated = timeit(simulate, number=1)
+            by_rows = timeit(lambda: count_sand_by_rows(cave), number=1)
+            print(f'{size // 2:>6} {size:>6} {result:>9} {simulated:>14.4f} {by_rows:>12.4f}')
+
+
+def benchmark_read_dense():
+    """Compare read() with read_dense() on files with many rock paths, and the simulators that use them"""
+    print(f'{"rock paths":>10} {"read (s)":>9} {"read_dense (s)":>15} {"fill (s)":>9} {"fill_dense (s)":>15}')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'cave.txt')
+        for rock_paths in (10 ** 3, 10 ** 4, 10 ** 5, 3 * 10 ** 5):
+            generate_cave(path, 1000, 2000, rock_paths, basin=False)
+            read_time = timeit(lambda: read(path), number=1)
+            read_dense_time = timeit(lambda: read_dense(path, True), number=1)
+            cave = read(path)
+            fill_time = timeit(lambda: fill_cave_with_sand(cave.fork(), True), number=1)
+            fill_dense_time = timeit(lambda: fill_dense_with_sand(*read_dense(path, True), True), number=1)
+            print(f'{rock_paths:>10} {read_time:>9.4f} {read_dense_time:>15.4f} {fill_time:>9.4f} {fill_dense_time:>15.4f}')
+
+
+def benchmark_sand_trace():
+    """Measure the overhead of tracing a simulation, and the size of the trace"""
+    print(f'{"engine":>8} {"trace every":>11} {"time (s)":>10} {"trace size (KiB)":>17}')
+    with tempfile.TemporaryDirectory() as directory:
+        trace_path = os.path.join(directory, 'trace.bin')
+        for engine in SAND_ENGINES:
+            for every in (None, 1, 100, 10000):
+                def run():
+                    if every is None:
+                        fast_fill_with_sand('input.txt', True, engine=engine)
+                    else:
+                        fast_fill_with_sand('input.txt', True, engine=engine, trace_path=trace_path, trace_every=every)
+
+                time = timeit(run, number=5) / 5
+                size = f'{os.path.getsize(trace_path) / 2 ** 10:.1f}' if every is not None else '-'
+                print(f'{engine:>8} {every or "off":>11} {time:>10.4f} {size:>17}')
+
+
 def part_1():
     result = fill_with_sand('input.txt')
     print(f'{result} units of sand came to rest.')
@@ -165,15 +802,68 @@ def part_2():
     print('Copied to clipboard!')
 
 
+def part_2_by_rows():
+    result = fill_with_sand_by_rows('input.txt')
+    print(f'{result} units of sand came to rest.')
+    pyperclip.copy(result)
+    print('Copied to clipboard!')
+
+
+# Colours used when saving a picture of the cave
+CAVE_COLOURS = {'#': (96, 88, 80), 'o': (230, 196, 120)}
+
+
+def save_picture(cave: MagicMatrix, path: str):
+    """
+    Save a picture of the cave as a PPM image, with one pixel per cell. The picture is written one row at a time, so
+    this is suitable for very large caves
+    :param cave: Slice of the cave to draw
+    :param path: Path of the image file to write
+    :return: None
+    """
+    with open(path, 'wb') as f:
+        cave.write_pnm(f, CAVE_COLOURS, (16, 16, 24))
+
+
+def part_2_picture():
+    cave = read('input.txt')
+    result = fill_cave_with_sand(cave, True)
+    save_picture(cave, 'part_2.ppm')
+    print(f'{result} units of sand came to rest. Saved a picture to part_2.ppm')
+
+
+def both_parts():
+    part_1_result, part_2_result = fill_with_sand_both_parts('input.txt')
+    print(f'Part 1: {part_1_result} units of sand came to rest.')
+    print(f'Part 2: {part_2_result} units of sand came to rest.')
+
+
 def main():
     print('Day 14 - Regolith Reservoir')
     selector = OptionSelector()
     selector.add_option('1', 'part 1 (slow)', part_1)
     selector.add_option('1f', 'part 1 (fast)', part_1_fast)
     selector.add_option('2', 'part 2', part_2)
+    selector.add_option('2r', 'part 2 (row propagation)', part_2_by_rows)
+    selector.add_option('b', 'both parts (single parse)', both_parts)
+    selector.add_option('p2', 'part 2 picture (saved as PPM)', part_2_picture)
     selector.add_option('tr', 'test read (visual)', test_read)
+    selector.add_option('tc', 'test MagicMatrix column limit', test_matrix_column_limit)
     selector.add_option('tf', 'test fill with sand (visual + automated)', test_fill_with_sand)
     selector.add_option('tf2', 'test fast fill with sand (visual + automated)', test_fast_fill_with_sand)
+    selector.add_option('tfo', 'test fast fill with sand using an occupancy index',
+                        test_fast_fill_with_sand_occupancy_index)
+    selector.add_option('tb', 'test both parts from a single parse', test_fill_with_sand_both_parts)
+    selector.add_option('te', 'test every sand engine', test_sand_engines)
+    selector.add_option('tr2', 'test row propagation against the simulator', test_fill_with_sand_by_rows)
+    selector.add_option('tt', 'test tracing', test_sand_trace)
+    selector.add_option('td', 'test dense loader and simulator', test_dense_fill_with_sand)
+    selector.add_option('bf', 'benchmark fill with sand', benchmark_fill_with_sand)
+    selector.add_option('bm', 'benchmark MagicMatrix backends', benchmark_matrix_types)
+    selector.add_option('be', 'benchmark sand engines', benchmark_sand_engines)
+    selector.add_option('br', 'benchmark row propagation', benchmark_fill_with_sand_by_rows)
+    selector.add_option('bt', 'benchmark tracing', benchmark_sand_trace)
+    selector.add_option('bd', 'benchmark dense loader', benchmark_read_dense)
     selector.run()
 
 
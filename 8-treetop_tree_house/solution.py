@@ -1,21 +1,78 @@
 import numpy as np
 import numpy.typing as npt
+import os
 import pyperclip
+import tempfile
+from timeit import timeit
+import tracemalloc
 
+import load_file
 from option_selection import OptionSelector
 from testing import test_bed
 
 
 def read(path):
+    return load_file.as_digit_array(path)
+
+
+def read_by_lines(path):
+    """Read the grid one digit at a time, as read() did before load_file.as_digit_array() was used"""
     with open(path, 'r') as f:
         data = f.read().rstrip().split('\n')
     grid = np.empty((len(data), len(data[0])), int)
     for i in range(len(data)):
-        for j in range(len(data)):
+        for j in range(len(data[0])):
             grid[i, j] = int(data[i][j])
     return grid
 
 
+def test_read():
+    inputs = ['test.txt', 'input.txt']
+    test_bed(lambda path: read(path).tolist(), inputs, [read_by_lines(x).tolist() for x in inputs])
+
+    def read_error(contents: bytes):
+        path = os.path.join(directory, 'grid.txt')
+        with open(path, 'wb') as f:
+            f.write(contents)
+        try:
+            return read(path).tolist()
+        except ValueError as e:
+            return str(e).replace(path, 'grid.txt')
+
+    # Line endings, and files with blank first lines, ragged rows or other characters
+    with tempfile.TemporaryDirectory() as directory:
+        inputs = [b'12\r\n34\r\n', b'1', b'\n123\n456\n', b'12\n3\n456', b'12\r\n3\r\n45', b'12\n3a\n']
+        test_bed(read_error, inputs, [[[1, 2], [3, 4]], [[1]], 'grid.txt starts with an empty line',
+                                      'grid.txt does not have rows of 2 characters',
+                                      'grid.txt does not have rows of 2 characters',
+                                      'grid.txt contains characters other than digits'])
+
+
+def benchmark_read():
+    """Compare reading large generated grids one digit at a time with reading them from a memory map"""
+    print(f'{"size":>11} {"file (MiB)":>10} {"reader":>14} {"peak memory (MiB)":>18} {"time (s)":>10}')
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'grid.txt')
+        for size in (1000, 3000, 10000, 20000):
+            with open(path, 'wb') as f:
+                for _ in range(0, size, 1000):
+                    rows = rng.integers(ord('0'), ord('9') + 1, (min(1000, size), size + 1), np.uint8)
+                    rows[:, -1] = ord('\n')
+                    f.write(rows.tobytes())
+            readers = {'as_digit_array': read}
+            if size <= 3000:
+                readers['by lines'] = read_by_lines
+            for name, reader in readers.items():
+                time = timeit(lambda: reader(path), number=1)
+                tracemalloc.start()
+                reader(path)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print(f'{f"{size}x{size}":>11} {os.path.getsize(path) / 2 ** 20:>10.1f} {name:>14} '
+                      f'{peak / 2 ** 20:>18.1f} {time:>10.4f}')
+
+
 def initialize_visibility_matrix(grid: npt.NDArray):
     return np.full(grid.shape, False, bool)
 
@@ -156,9 +213,11 @@ def main():
     selector = OptionSelector()
     selector.add_option('1', 'part 1', part_1)
     selector.add_option('2', 'part 2', part_2)
+    selector.add_option('tr', 'test read()', test_read)
     selector.add_option('tc', 'test count_visible_trees()', test_count_visible_trees)
     selector.add_option('ts', 'test get_scenic_score', test_get_scenic_score)
     selector.add_option('th', 'test get_highest_scenic_score', test_get_highest_scenic_score)
+    selector.add_option('br', 'benchmark read()', benchmark_read)
     selector.run()
 
 
@@ -1,5 +1,6 @@
 import pyperclip
 
+import load_file
 from testing import test_bed
 from option_selection import OptionSelector
 
@@ -21,8 +22,8 @@ def parse_instruction(line: str):
 
 
 def read(path: str):
-    with open(path, 'r') as f:
-        return (parse_instruction(line) for line in f.read().rstrip().split('\n'))
+    # Lines are read as the instructions are needed, so the whole file is never held in memory
+    return (parse_instruction(line) for line in load_file.iter_strings(path) if line)
 
 
 def update_rope_head(motion_vector: tuple[int], head_position: list[int]):
@@ -1,5 +1,6 @@
 from colorama import Fore, Style
 from math import floor, log10, sqrt
+import numpy as np
 
 
 class BingoBoard:
@@ -19,77 +20,193 @@ class BingoBoard:
         self.win = None
         self.called_on_board = False
 
+        # Index of the first tile holding each number
+        self.__index = {}
+        for i, x in enumerate(contents):
+            self.__index.setdefault(x, i)
+        # Marked tiles in each line: the rows, then the columns, then the diagonal from the top left, then the diagonal
+        # from the top right. A full line never stops being full, so only the first full line in that order matters
+        # The diagonals are counted even without diagonal_win, so that it may be changed between calls
+        self.__line_marks = [0] * (2 * self.size + 2)
+        self.__first_full_line = None
+        self.__first_full_diagonal = None
+        self.__win_line = None
+        self.__unmarked_sum = sum(contents)
+
+    def __line_tiles(self, line):
+        """Get the indices of the tiles in a line, numbered as in __line_marks"""
+        size = self.size
+        if line < size:
+            return list(range(line * size, line * size + size))
+        if line < 2 * size:
+            return list(range(line - size, len(self.contents), size))
+        if line == 2 * size:
+            return list(range(0, len(self.contents), size + 1))
+        return list(range(size - 1, len(self.contents) - 1, size - 1))
+
     def call(self, number):
         """If the called number is in the board, mark it. Then, if the called number resulted in a win, return the
-        score of the win. Otherwise, return False. """
+        score of the win. Otherwise, return False. Finding the number, checking for a win and scoring it all take
+        constant time, using an index of the numbers, a count of the marked tiles in each line and a running sum of the
+        unmarked numbers """
 
         self.last_call = number
 
         # Mark the number if it is on the board
 
-        marked = False
-        for i in range(len(self.contents)):
-            if self.contents[i] == number:
-                self.marks[i] = True
-                self.called_on_board = True
-                marked = True
-                break
+        i = self.__index.get(number)
         # Can't have won if no new number was marked
-        if not marked:
+        if i is None:
             self.called_on_board = False
             return False
-
-        # Determine if a winning number was called
-
-        win = False
-        # Check for a win on a row
-        for i in range(0, len(self.contents), self.size):
-            for j in range(self.size):
-                if not self.marks[i + j]:
-                    break
-                if j == self.size - 1:
-                    self.win = [x for x in range(i, i + self.size, 1)]
-                    win = True
-            if win:
-                break
-        # Check for a win in a column
-        if not win:
-            for i in range(self.size):
-                for j in range(0, len(self.contents), self.size):
-                    if not self.marks[i + j]:
-                        break
-                    if j == len(self.contents) - self.size:
-                        self.win = [x for x in range(i, len(self.contents), self.size)]
-                        win = True
-                if win:
-                    break
-        # Check for a diagonal win
-        if not win and self.diagonal_win:
-            for i in range(0, len(self.contents), self.size + 1):
-                if not self.marks[i]:
-                    break
-                if i == len(self.contents) - 1:
-                    self.win = [x for x in range(0, len(self.contents), self.size + 1)]
-                    win = True
-            if not win:
-                for i in range(self.size - 1, len(self.contents) - 1, self.size - 1):
-                    if not self.marks[i]:
-                        break
-                    if i == len(self.contents) - self.size:
-                        self.win = [x for x in range(self.size - 1, len(self.contents) - 1, self.size - 1)]
-                        win = True
+        self.called_on_board = True
+
+        if not self.marks[i]:
+            self.marks[i] = True
+            self.__unmarked_sum -= self.contents[i]
+            size = self.size
+            row, column = divmod(i, size)
+            lines = [row, size + column]
+            if row == column:
+                lines.append(2 * size)
+            if row + column == size - 1:
+                lines.append(2 * size + 1)
+            for line in lines:
+                self.__line_marks[line] += 1
+                if self.__line_marks[line] < size:
+                    continue
+                if line < 2 * size:
+                    if self.__first_full_line is None or line < self.__first_full_line:
+                        self.__first_full_line = line
+                elif self.__first_full_diagonal is None or line < self.__first_full_diagonal:
+                    self.__first_full_diagonal = line
 
         # Handle winning
 
-        if win:
-
-            # Score = (sum of all unmarked numbers) * (last called number)
-            score = 0
-            for i in range(len(self.contents)):
-                if not self.marks[i]:
-                    score += self.contents[i]
-            return score * number
-        return False
+        line = self.__first_full_line
+        if line is None and self.diagonal_win:
+            line = self.__first_full_diagonal
+        if line is None:
+            return False
+        # The tiles are only listed when the winning line changes, to keep calls after a win constant time too
+        if line != self.__win_line:
+            self.__win_line = line
+            self.win = self.__line_tiles(line)
+        # Score = (sum of all unmarked numbers) * (last called number)
+        return self.__unmarked_sum * number
+
+
+class BingoHall:
+    """Many Bingo boards playing the same game, stacked into a single array. Instead of calling the numbers one at a
+    time, the turn each number is called on is looked up for every tile at once. A line is complete on the turn its last
+    number is called, and a board wins on the turn its first line is complete, so every board's winning turn and score
+    come from a few array operations, without playing the game """
+
+    def __init__(self, boards, calls, diagonal_win=False):
+        """
+        :param boards: Contents of each board, as an array or nested lists with a shape of (boards, size * size) or
+        (boards, size, size)
+        :param calls: Numbers in the order they are called
+        :param diagonal_win: Whether a board can also win on its diagonals, as in BingoBoard
+        """
+        self.contents = np.asarray(boards)
+        if len(self.contents) == 0:
+            self.contents = np.zeros((0, 0), np.int64)
+        self.size = int(sqrt(self.contents[0].size)) if len(self.contents) else 0
+        self.contents = self.contents.reshape(len(self.contents), self.size, self.size)
+        self.calls = np.asarray(calls)
+        self.diagonal_win = diagonal_win
+        # Turn that stands for never being called
+        self.never = len(self.calls)
+
+        # Turn each number is first called on. Called numbers usually span a small range, so the turns are looked up
+        # in a table covering that range, falling back to a binary search of the distinct calls when it would be large
+        distinct, first_turns = np.unique(self.calls, return_index=True)
+        first_turns = first_turns.astype(np.int32)
+        if len(distinct) == 0:
+            self.turns = np.full(self.contents.shape, self.never, np.int32)
+        elif int(distinct[-1]) - int(distinct[0]) < 4 * (self.contents.size + len(distinct)):
+            low, high = int(distinct[0]), int(distinct[-1])
+            table = np.full(high - low + 2, self.never, np.int32)
+            table[distinct - low] = first_turns
+            # Numbers outside the range of the calls look up the last entry, which is never called
+            offsets = self.contents - low
+            self.turns = table[np.where((offsets >= 0) & (offsets <= high - low), offsets, high - low + 1)]
+        else:
+            positions = np.minimum(np.searchsorted(distinct, self.contents), len(distinct) - 1)
+            self.turns = np.where(distinct[positions] == self.contents, first_turns[positions], np.int32(self.never))
+
+        # Like BingoBoard, only mark the first tile of a number that appears more than once on a board. Sorting each
+        # board finds out whether any do, and the slower stable argsort is only needed to find which tiles they are
+        flat_contents = self.contents.reshape(len(self.contents), self.size * self.size)
+        if (np.diff(np.sort(flat_contents, axis=1), axis=1) == 0).any():
+            order = np.argsort(flat_contents, axis=1, kind='stable')
+            repeats = np.zeros(flat_contents.shape, bool)
+            repeats[:, 1:] = np.diff(np.take_along_axis(flat_contents, order, 1), axis=1) == 0
+            flat_turns = self.turns.reshape(len(self.contents), self.size * self.size)
+            sorted_turns = np.take_along_axis(flat_turns, order, 1)
+            np.put_along_axis(flat_turns, order, np.where(repeats, self.never, sorted_turns), 1)
+
+        # Turn each line is complete on: the turn of its last number
+        lines = [self.turns.max(axis=2, initial=0), self.turns.max(axis=1, initial=0)]
+        if diagonal_win:
+            tiles = np.arange(self.size)
+            lines.append(self.turns[:, tiles, tiles].max(axis=1, keepdims=True))
+            lines.append(self.turns[:, tiles, self.size - 1 - tiles].max(axis=1, keepdims=True))
+        # Turn each board wins on: the turn of its first complete line, or never
+        self.win_turns = np.concatenate(lines, axis=1).min(axis=1, initial=self.never)
+
+    def winners(self):
+        """
+        Get the boards that win, in the order they win. Boards that win on the same turn are in the order they were
+        given in
+        :return: Array of the indices of the boards
+        """
+        order = np.argsort(self.win_turns, kind='stable')
+        return order[:np.count_nonzero(self.win_turns < self.never)]
+
+    def score(self, board):
+        """
+        Get the score of a board when it wins: the sum of the numbers still unmarked, times the winning number
+        :param board: Index of the board
+        :return: The score, or False if the board never wins
+        """
+        turn = self.win_turns[board]
+        if turn == self.never:
+            return False
+        return int(self.contents[board][self.turns[board] > turn].sum()) * int(self.calls[turn])
+
+    def scores(self):
+        """
+        Get the score of every board when it wins, all at once
+        :return: Array of the scores, with 0 for boards that never win
+        """
+        turns = self.win_turns.reshape(-1, 1, 1)
+        unmarked = np.where(self.turns > turns, self.contents, 0).sum(axis=(1, 2))
+        winning_numbers = self.calls[np.minimum(self.win_turns, self.never - 1)] if self.never else 0
+        return np.where(self.win_turns < self.never, unmarked * winning_numbers, 0)
+
+    def first_winner(self):
+        """
+        Get the first board to win. If boards tie, the first of them given wins
+        :return: (index of the board, turn it wins on, its score), or None if no board wins
+        """
+        winners = self.winners()
+        if len(winners) == 0:
+            return None
+        board = int(winners[0])
+        return board, int(self.win_turns[board]), self.score(board)
+
+    def last_winner(self):
+        """
+        Get the last board to win, of the boards that win at all. If boards tie, the last of them given wins last
+        :return: (index of the board, turn it wins on, its score), or None if no board wins
+        """
+        winners = self.winners()
+        if len(winners) == 0:
+            return None
+        board = int(winners[-1])
+        return board, int(self.win_turns[board]), self.score(board)
 
 
 def draw_boards(*args):
@@ -0,0 +1,250 @@
+"""Tests and benchmarks for bingo_board.py"""
+
+import random
+from timeit import timeit
+
+import numpy as np
+
+from bingo_board import BingoBoard, BingoHall, draw_boards
+from option_selection import OptionSelector
+from testing import test_bed
+
+
+class ScanningBingoBoard(BingoBoard):
+    """A Bingo board that marks numbers with the original, linear time call()"""
+
+    def call(self, number):
+        """The original call(), which scans the whole board for the number, every line for a win and every tile for
+        the score"""
+
+        self.last_call = number
+
+        # Mark the number if it is on the board
+
+        marked = False
+        for i in range(len(self.contents)):
+            if self.contents[i] == number:
+                self.marks[i] = True
+                self.called_on_board = True
+                marked = True
+                break
+        # Can't have won if no new number was marked
+        if not marked:
+            self.called_on_board = False
+            return False
+
+        # Determine if a winning number was called
+
+        win = False
+        # Check for a win on a row
+        for i in range(0, len(self.contents), self.size):
+            for j in range(self.size):
+                if not self.marks[i + j]:
+                    break
+                if j == self.size - 1:
+                    self.win = [x for x in range(i, i + self.size, 1)]
+                    win = True
+            if win:
+                break
+        # Check for a win in a column
+        if not win:
+            for i in range(self.size):
+                for j in range(0, len(self.contents), self.size):
+                    if not self.marks[i + j]:
+                        break
+                    if j == len(self.contents) - self.size:
+                        self.win = [x for x in range(i, len(self.contents), self.size)]
+                        win = True
+                if win:
+                    break
+        # Check for a diagonal win
+        if not win and self.diagonal_win:
+            for i in range(0, len(self.contents), self.size + 1):
+                if not self.marks[i]:
+                    break
+                if i == len(self.contents) - 1:
+                    self.win = [x for x in range(0, len(self.contents), self.size + 1)]
+                    win = True
+            if not win:
+                for i in range(self.size - 1, len(self.contents) - 1, self.size - 1):
+                    if not self.marks[i]:
+                        break
+                    if i == len(self.contents) - self.size:
+                        self.win = [x for x in range(self.size - 1, len(self.contents) - 1, self.size - 1)]
+                        win = True
+
+        # Handle winning
+
+        if win:
+
+            # Score = (sum of all unmarked numbers) * (last called number)
+            score = 0
+            for i in range(len(self.contents)):
+                if not self.marks[i]:
+                    score += self.contents[i]
+            return score * number
+        return False
+
+
+def random_game(size: int, seed: int = 0, duplicates: bool = False) -> tuple[list[int], list[int]]:
+    """
+    Generate a random board and the order the numbers are called in
+    :param size: Width and height of the board
+    :param seed: Seed for the random number generator
+    :param duplicates: Whether the board, and the calls, may repeat numbers
+    :return: The contents of the board, and the calls, which also include numbers not on the board
+    """
+    rng = random.Random(seed)
+    numbers = list(range(1, 3 * size * size + 1))
+    if duplicates:
+        contents = [rng.choice(numbers[:size * size]) for _ in range(size * size)]
+        calls = [rng.choice(numbers) for _ in range(4 * size * size)]
+    else:
+        contents = rng.sample(numbers, size * size)
+        calls = rng.sample(numbers, len(numbers))
+    return contents, calls
+
+
+def play(board_type, contents: list[int], calls: list[int], diagonal_win: bool) -> list:
+    """Play every call on a board, recording everything call() returns and changes"""
+    board = board_type(contents, diagonal_win)
+    return [(board.call(x), board.win, board.called_on_board, board.last_call, list(board.marks)) for x in calls]
+
+
+def random_hall(boards: int, size: int = 5, numbers: int = 100, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Generate random boards of distinct numbers and the order the numbers are called in, as quickly as NumPy can
+    :param boards: Number of boards
+    :param size: Width and height of each board
+    :param numbers: The numbers are 0 to numbers - 1, and are all called once
+    :param seed: Seed for the random number generator
+    :return: Array of the boards, with one board per row, and array of the calls
+    """
+    rng = np.random.default_rng(seed)
+    contents = np.argsort(rng.random((boards, numbers)), axis=1)[:, :size * size].astype(np.int32)
+    return contents, rng.permutation(numbers)
+
+
+def play_hall(board_type, boards, calls: list[int], diagonal_win: bool) -> tuple[list, list]:
+    """Play a game on many boards one call at a time, recording the turn each board wins on and its score"""
+    boards = [board_type(list(contents), diagonal_win) for contents in boards]
+    win_turns = [len(calls)] * len(boards)
+    scores = [False] * len(boards)
+    playing = list(range(len(boards)))
+    for turn, number in enumerate(calls):
+        still_playing = []
+        for i in playing:
+            score = boards[i].call(number)
+            if score is False:
+                still_playing.append(i)
+            else:
+                win_turns[i], scores[i] = turn, score
+        playing = still_playing
+    return win_turns, scores
+
+
+def test_call():
+    """Check call() against the original scanning call() on random games, with and without diagonal wins"""
+    games = [random_game(size, seed, duplicates) for size in (1, 2, 3, 5, 8) for seed in range(4)
+             for duplicates in (False, True)]
+    games.append(([14, 21, 17, 24, 4, 10, 16, 15, 9, 19, 18, 8, 23, 26, 20, 22, 11, 13, 6, 5, 2, 0, 12, 3, 7],
+                  [7, 4, 9, 5, 11, 17, 23, 2, 0, 14, 21, 24, 10, 16, 13, 6, 15, 25, 12, 22, 18, 20, 8, 19, 3, 26, 1]))
+    for diagonal_win in (False, True):
+        print(f'Diagonal wins: {diagonal_win}')
+        test_bed(lambda contents, calls: play(BingoBoard, contents, calls, diagonal_win), games,
+                 [play(ScanningBingoBoard, contents, calls, diagonal_win) for contents, calls in games])
+    # The winning board from the puzzle wins on its first row, with a score of 188 * 24
+    board = BingoBoard(*games[-1][:1])
+    scores = [board.call(x) for x in games[-1][1][:12]]
+    assert scores[-1] == 188 * 24 and board.win == [0, 1, 2, 3, 4] and not any(scores[:-1])
+    draw_boards(board, ScanningBingoBoard(*games[-1][:1]))
+
+
+def test_hall():
+    """Check BingoHall against playing every board one call at a time, with and without diagonal wins"""
+    games = []
+    for seed in range(6):
+        rng = random.Random(seed)
+        size = rng.randint(1, 6)
+        boards = [random_game(size, rng.randrange(10 ** 6), seed % 2 == 1)[0] for _ in range(rng.randint(1, 40))]
+        calls = random_game(size, seed, seed % 2 == 1)[1][:rng.randint(0, 3 * size * size)]
+        games.append((boards, calls))
+    games.append(tuple(x.tolist() for x in random_hall(300, 5, 100, 0)))
+    games.append(tuple(x.tolist() for x in random_hall(300, 5, 100, 1)))
+    games.append(([[1, 2, 3, 4]] * 3, [5, 6]))
+    # Numbers too far apart to look up in a table, and negative numbers
+    boards, calls = games[-2]
+    games.append(([[x * 10 ** 6 for x in board] for board in boards], [x * 10 ** 6 for x in calls]))
+    games.append(([[x - 50 for x in board] for board in boards], [x - 50 for x in calls]))
+    for diagonal_win in (False, True):
+        print(f'Diagonal wins: {diagonal_win}')
+
+        def hall_results(boards, calls):
+            hall = BingoHall(boards, calls, diagonal_win)
+            return hall.win_turns.tolist(), [hall.score(i) for i in range(len(boards))]
+
+        expected = [play_hall(BingoBoard, boards, calls, diagonal_win) for boards, calls in games]
+        test_bed(hall_results, games, expected)
+        for (boards, calls), (win_turns, scores) in zip(games, expected):
+            hall = BingoHall(boards, calls, diagonal_win)
+            assert hall.scores().tolist() == [x or 0 for x in scores]
+            winners = sorted((x for x in range(len(boards)) if win_turns[x] < len(calls)), key=lambda x: win_turns[x])
+            assert hall.winners().tolist() == winners
+            if winners:
+                assert hall.first_winner() == (winners[0], win_turns[winners[0]], scores[winners[0]])
+                assert hall.last_winner() == (winners[-1], win_turns[winners[-1]], scores[winners[-1]])
+            else:
+                assert hall.first_winner() is None and hall.last_winner() is None
+
+
+def benchmark_call():
+    """Compare call() with the original scanning call(), calling every number until the board is full"""
+    print(f'{"size":>6} {"calls":>8} {"board":>20} {"time (s)":>10} {"calls/s":>12}')
+    for size in (5, 10, 30, 100, 300):
+        contents, calls = random_game(size)
+        board_types = [BingoBoard]
+        if size <= 100:
+            board_types.append(ScanningBingoBoard)
+        for board_type in board_types:
+            board = board_type(contents, True)
+            time = timeit(lambda: [board.call(x) for x in calls], number=1)
+            print(f'{size:>6} {len(calls):>8} {board_type.__name__:>20} {time:>10.4f} {len(calls) / time:>12.0f}')
+
+
+def benchmark_hall():
+    """Compare BingoHall with playing every board one call at a time, finding the first and last winners"""
+    print(f'{"boards":>8} {"engine":>12} {"time (s)":>10} {"first winner":>26} {"last winner":>26}')
+    for boards in (1000, 10000, 100000, 1000000):
+        contents, calls = random_hall(boards)
+        engines = {'BingoHall': lambda: BingoHall(contents, calls)}
+        if boards <= 10000:
+            engines['BingoBoard'] = lambda: play_hall(BingoBoard, contents.tolist(), calls.tolist(), False)
+        for name, engine in engines.items():
+            result = None
+
+            def run():
+                nonlocal result
+                result = engine()
+
+            time = timeit(run, number=1)
+            if isinstance(result, BingoHall):
+                first, last = result.first_winner(), result.last_winner()
+            else:
+                win_turns, scores = result
+                winners = sorted(range(boards), key=lambda x: win_turns[x])
+                first, last = [(x, win_turns[x], scores[x]) for x in (winners[0], winners[-1])]
+            print(f'{boards:>8} {name:>12} {time:>10.4f} {str(first):>26} {str(last):>26}')
+
+
+def main():
+    print('Bingo board')
+    selector = OptionSelector()
+    selector.add_option('t', 'test call', test_call)
+    selector.add_option('th', 'test Bingo hall', test_hall)
+    selector.add_option('b', 'benchmark call', benchmark_call)
+    selector.add_option('bh', 'benchmark Bingo hall', benchmark_hall)
+    selector.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,15 @@
 """Based on https://www.redblobgames.com/pathfinding/a-star/implementation.html but with some changes and
 simplifications """
 
+from array import array as compact_array
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
 from numpy import array
 from heapq import heappush, heappop
 import load_file
+import os
 
 
 class PriorityQueue:
@@ -16,25 +22,144 @@ class PriorityQueue:
     def peek(self):
         return self.elements[0][1]
 
+    def peek_priority(self) -> int:
+        return self.elements[0][0]
+
     def pop(self) -> any:
         return heappop(self.elements)[1]
 
     def empty(self) -> bool:
         return not self.elements
 
+    def __len__(self) -> int:
+        return len(self.elements)
+
+
+class IndexedPriorityQueue:
+    """
+    A binary heap of the integers 0 to capacity - 1, each with a priority, that can lower the priority of an item already
+    in the queue instead of pushing it again. Unlike PriorityQueue, it never holds more than one entry for an item, so it
+    is never larger than the frontier of a search. Items and priorities are kept in parallel lists, and the position of
+    each item in the heap in a compact array indexed by item
+    """
+    def __init__(self, capacity: int):
+        """
+        Constructor
+        :param capacity: Number of distinct items the queue can hold. Items must be in range(capacity)
+        """
+        self.__items: list[int] = []
+        self.__priorities: list[int] = []
+        self.__positions = compact_array('i', [-1]) * capacity
+
+    def __sift_up(self, position: int, item: int, priority: int):
+        """Move an item up the heap from a position until its parent has a lower or equal priority"""
+        items, priorities, positions = self.__items, self.__priorities, self.__positions
+        while position:
+            parent = (position - 1) >> 1
+            if priorities[parent] <= priority:
+                break
+            items[position] = parent_item = items[parent]
+            priorities[position] = priorities[parent]
+            positions[parent_item] = position
+            position = parent
+        items[position] = item
+        priorities[position] = priority
+        positions[item] = position
+
+    def __sift_down(self, position: int, item: int, priority: int):
+        """Move an item down the heap from a position until neither child has a lower priority"""
+        items, priorities, positions = self.__items, self.__priorities, self.__positions
+        size = len(items)
+        while (child := 2 * position + 1) < size:
+            if child + 1 < size and priorities[child + 1] < priorities[child]:
+                child += 1
+            if priorities[child] >= priority:
+                break
+            items[position] = child_item = items[child]
+            priorities[position] = priorities[child]
+            positions[child_item] = position
+            position = child
+        items[position] = item
+        priorities[position] = priority
+        positions[item] = position
+
+    def push(self, item: int, priority: int):
+        """
+        Add an item to the queue. If it is already in the queue, its priority is lowered to the given priority instead;
+        a priority higher than its current one is ignored
+        """
+        position = self.__positions[item]
+        if position < 0:
+            self.__items.append(item)
+            self.__priorities.append(priority)
+            self.__sift_up(len(self.__items) - 1, item, priority)
+        elif priority < self.__priorities[position]:
+            self.__sift_up(position, item, priority)
+
+    def decrease_key(self, item: int, priority: int):
+        """
+        Lower the priority of an item in the queue
+        :raises KeyError: If the item is not in the queue
+        :raises ValueError: If the priority is higher than the item's current priority
+        """
+        if (position := self.__positions[item]) < 0:
+            raise KeyError(item)
+        if priority > self.__priorities[position]:
+            raise ValueError(f'{priority} is higher than the current priority of {item}, {self.__priorities[position]}')
+        self.__sift_up(position, item, priority)
+
+    def peek(self) -> int:
+        return self.__items[0]
+
+    def peek_priority(self) -> int:
+        return self.__priorities[0]
+
+    def pop(self) -> int:
+        items, priorities = self.__items, self.__priorities
+        item = items[0]
+        self.__positions[item] = -1
+        last_item = items.pop()
+        last_priority = priorities.pop()
+        if items:
+            self.__sift_down(0, last_item, last_priority)
+        return item
+
+    def empty(self) -> bool:
+        return not self.__items
+
+    def __len__(self) -> int:
+        return len(self.__items)
+
+    def __contains__(self, item: int) -> bool:
+        return self.__positions[item] >= 0
+
+    def priority(self, item: int) -> int:
+        """
+        Get the priority of an item in the queue
+        :raises KeyError: If the item is not in the queue
+        """
+        if (position := self.__positions[item]) < 0:
+            raise KeyError(item)
+        return self.__priorities[position]
+
 
 GridLocation = tuple[int, int]
 
 
 class WeightedGrid:
-    def __init__(self, weights):
-        self.weights = array(weights)
+    def __init__(self, weights, copy: bool = True):
+        """
+        Constructor
+        :param weights: 2D array of the cost of moving into each location
+        :param copy: If false and weights is already a NumPy array, the grid uses it rather than a copy of it
+        """
+        self.weights = array(weights) if copy else np.asarray(weights)
         self.rows = len(weights)
         self.cols = len(weights[0])
 
     @classmethod
     def from_file(cls, file_name):
-        return cls(load_file.as_digit_grid(file_name))
+        return cls(load_file.as_digit_array(file_name), copy=False)
 
     def in_bounds(self, location: GridLocation):
         (i, j) = location
@@ -45,26 +170,516 @@ class WeightedGrid:
         neighbors = [(i + 1, j), (i, j + 1), (i - 1, j), (i, j - 1)]
         return filter(self.in_bounds, neighbors)
 
+    def weight(self, location: GridLocation) -> int:
+        """Get the cost of moving into a location"""
+        return int(self.weights[location])
+
+    def flat_weights(self):
+        """
+        Get the weights as a flat int32 array, indexed by i * self.cols + j. The array is returned as a memoryview, since
+        indexing a memoryview with Python ints is much faster than indexing the array itself
+        """
+        return memoryview(np.ascontiguousarray(self.weights, np.int32).ravel())
+
+    def min_weight(self) -> int:
+        return int(self.weights.min())
+
+    def max_weight(self) -> int:
+        return int(self.weights.max())
+
+    def cost_map(self, start: GridLocation = (0, 0)):
+        """
+        Find the cost of the cheapest path from a location to every location in the grid, with a single search
+        :param start: Location to start from
+        :return: 2D NumPy array of costs, with -1 for locations that cannot be reached
+        """
+        return _dial(self, start[0] * self.cols + start[1], None, False, None)[1].reshape(self.rows, self.cols)
+
+    def costs_from(self, start: GridLocation, goals: list[GridLocation]) -> list[int]:
+        """
+        Find the cost of the cheapest path from a location to each of several goals. All the goals share a single search,
+        which stops once every goal has been reached
+        :param start: Location to start from
+        :param goals: Locations to find the cheapest paths to
+        :return: List of the cost of the cheapest path to each goal
+        """
+        goal_indices = [i * self.cols + j for i, j in goals]
+        costs = _dial(self, start[0] * self.cols + start[1], set(goal_indices), False, None)[1]
+        if (costs[goal_indices] < 0).any():
+            raise ValueError(f'not every goal in {goals} can be reached from {start}')
+        return costs[goal_indices].tolist()
 
-def dijkstra_search(grid: WeightedGrid, start: GridLocation = (0, 0), goal: GridLocation = None):
+    def batch_costs(self, queries: list[tuple[GridLocation, GridLocation]], workers: int | None = None) -> list[int]:
+        """
+        Find the cost of the cheapest path for each of many (start, goal) queries. Queries from the same start share a
+        single search (see costs_from()). The searches from different starts are independent, so they are spread across
+        a pool of processes, which read the weights from shared memory instead of each receiving a copy
+        :param queries: List of (start, goal) pairs
+        :param workers: Number of processes to use. Defaults to the number of CPUs. With 1 worker, or only one start,
+        the searches are run in this process
+        :return: List of the cost of the cheapest path for each query, in the same order as the queries
+        """
+        by_start: dict[GridLocation, list[int]] = {}
+        for k, (start, _) in enumerate(queries):
+            by_start.setdefault(start, []).append(k)
+        searches = [(start, [queries[k][1] for k in ks]) for start, ks in by_start.items()]
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers == 1 or len(searches) <= 1:
+            results = [self.costs_from(start, goals) for start, goals in searches]
+        else:
+            results = _pooled_costs_from(self, searches, workers)
+        costs = [0] * len(queries)
+        for ks, search_costs in zip(by_start.values(), results):
+            for k, cost in zip(ks, search_costs):
+                costs[k] = cost
+        return costs
+
+    def _shared_parts(self):
+        """Get the weights that must be shared with other processes to rebuild the grid, and the tiling, if any"""
+        return self.weights, None
+
+
+def _wrap_weight(weight: int) -> int:
+    """Wrap a weight that has been increased past 9 back around to 1"""
+    return weight if weight <= 9 else (weight - 1) % 9 + 1
+
+
+class _TiledWeights:
+    """Flat view of the weights of a TiledWeightedGrid, computing each weight from the base grid when it is indexed"""
+    def __init__(self, grid: 'TiledWeightedGrid'):
+        base = grid.base
+        self.__cols = grid.cols
+        self.__base = base.flat_weights()
+        # Offset of each row and column of the tiled grid into the flat base grid, and the tile increment it adds
+        self.__row_offsets = [i % base.rows * base.cols for i in range(grid.rows)]
+        self.__row_tiles = [i // base.rows for i in range(grid.rows)]
+        self.__col_offsets = [j % base.cols for j in range(grid.cols)]
+        self.__col_tiles = [j // base.cols for j in range(grid.cols)]
+        self.__wrap = [_wrap_weight(x) for x in range(max(base.max_weight(), 0) + grid.tiles_down + grid.tiles_across)]
+
+    def __getitem__(self, index: int) -> int:
+        i, j = divmod(index, self.__cols)
+        return self.__wrap[self.__base[self.__row_offsets[i] + self.__col_offsets[j]]
+                           + self.__row_tiles[i] + self.__col_tiles[j]]
+
+
+class TiledWeightedGrid(WeightedGrid):
+    """
+    A WeightedGrid made of copies of a base grid, tiles_down copies high and tiles_across copies wide. Each tile's
+    weights are the base grid's weights plus the tile's row and column in the tiling, wrapping back around to 1 after 9.
+    Weights are computed from the base grid when they are needed, so the tiled grid takes no more memory than the base
+    grid. It has no weights array; use weight() or flat_weights() instead
+    """
+    def __init__(self, weights, tiles_down: int, tiles_across: int):
+        """
+        Constructor
+        :param weights: Weights of the base grid, or the base grid itself
+        :param tiles_down: Number of copies of the base grid down the tiled grid
+        :param tiles_across: Number of copies of the base grid across the tiled grid
+        """
+        if tiles_down < 1 or tiles_across < 1:
+            raise ValueError(f'a tiled grid needs at least 1 tile each way, got {tiles_down}x{tiles_across}')
+        self.base = weights if isinstance(weights, WeightedGrid) else WeightedGrid(weights)
+        self.tiles_down = tiles_down
+        self.tiles_across = tiles_across
+        self.rows = self.base.rows * tiles_down
+        self.cols = self.base.cols * tiles_across
+
+    @classmethod
+    def from_file(cls, file_name, tiles_down: int = 5, tiles_across: int = 5):
+        return cls(WeightedGrid.from_file(file_name), tiles_down, tiles_across)
+
+    def weight(self, location: GridLocation) -> int:
+        (i, j) = location
+        tile_i, base_i = divmod(i, self.base.rows)
+        tile_j, base_j = divmod(j, self.base.cols)
+        return _wrap_weight(self.base.weight((base_i, base_j)) + tile_i + tile_j)
+
+    def flat_weights(self):
+        """Get a flat view of the weights, indexed by i * self.cols + j, that computes each weight when it is indexed"""
+        return _TiledWeights(self)
+
+    def __tile_weights(self) -> set[int]:
+        """Get every weight that appears anywhere in the tiled grid"""
+        increments = range(min(self.tiles_down + self.tiles_across - 1, 9))
+        return {_wrap_weight(x + k) for x in np.unique(self.base.weights).tolist() for k in increments}
+
+    def min_weight(self) -> int:
+        return min(self.__tile_weights())
+
+    def max_weight(self) -> int:
+        return max(self.__tile_weights())
+
+    def _shared_parts(self):
+        return self.base.weights, (self.tiles_down, self.tiles_across)
+
+    def expand(self) -> WeightedGrid:
+        """Build the tiled grid as an ordinary WeightedGrid, with every weight stored"""
+        base = self.base.weights
+        increments = np.add.outer(np.arange(self.tiles_down), np.arange(self.tiles_across))
+        weights = np.kron(increments, np.ones(base.shape, int)) + np.tile(base, (self.tiles_down, self.tiles_across))
+        return WeightedGrid(np.where(weights > 9, (weights - 1) % 9 + 1, weights))
+
+
+def dijkstra_search(grid: WeightedGrid, start: GridLocation = (0, 0), goal: GridLocation = None,
+                    track_path: bool = True, stats: dict | None = None, indexed_queue: bool = False):
+    """
+    Find the cheapest path between two locations in a grid using Dijkstra's algorithm. Locations are identified by their
+    index in the flattened grid (i * grid.cols + j), and costs and predecessors are kept in flat int32 NumPy arrays
+    rather than dicts keyed by tuples
+    :param grid: Grid to search
+    :param start: Location to start from
+    :param goal: Location to find the cheapest path to. Defaults to the bottom right corner
+    :param track_path: If false, predecessors are not tracked, which saves memory when only the cost is needed
+    :param stats: If given, the number of locations expanded by the search is stored in it under 'expanded', and the
+    largest size of the frontier under 'max_frontier'
+    :param indexed_queue: If true, the frontier is an IndexedPriorityQueue, which lowers the cost of a location already
+    in the frontier instead of adding it again
+    :return: tuple containing a NumPy array of the flat index of the location each location was reached from (-1 for the
+    start and for locations that were not reached), or None if track_path is false, and the cost of the cheapest path to
+    the goal. Use reconstruct_path() to get the path
+    """
     if goal is None:
         goal = (grid.rows - 1, grid.cols - 1)
-    frontier = PriorityQueue()
-    came_from: dict[GridLocation, GridLocation | None] = {}
-    cost_so_far: dict[GridLocation, int] = {}
-    frontier.push(start, 0)
-    came_from[start] = None
-    cost_so_far[start] = 0
+    cols = grid.cols
+    size = grid.rows * cols
+    weights = grid.flat_weights()
+    cost_so_far = memoryview(np.full(size, -1, np.int32))
+    came_from = np.full(size, -1, np.int32) if track_path else None
+    came_from_view = memoryview(came_from) if track_path else None
+    frontier = IndexedPriorityQueue(size) if indexed_queue else PriorityQueue()
+    start_index = start[0] * cols + start[1]
+    goal_index = goal[0] * cols + goal[1]
+    frontier.push(start_index, 0)
+    cost_so_far[start_index] = 0
+    expanded = 0
+    max_frontier = 0
 
     while not frontier.empty():
-        current: GridLocation = frontier.pop()
-        if current == goal:
+        if stats is not None:
+            max_frontier = max(max_frontier, len(frontier))
+        current = frontier.pop()
+        expanded += 1
+        if current == goal_index:
             break
-        for next_ in grid.neighbors(current):
-            new_cost = cost_so_far[current] + grid.weights[next_]
-            if next_ not in cost_so_far or new_cost < cost_so_far[next_]:
+        j = current % cols
+        for next_ in (current + cols if current + cols < size else -1, current + 1 if j + 1 < cols else -1,
+                      current - cols, current - 1 if j else -1):
+            if next_ < 0:
+                continue
+            new_cost = cost_so_far[current] + weights[next_]
+            old_cost = cost_so_far[next_]
+            if old_cost < 0 or new_cost < old_cost:
                 cost_so_far[next_] = new_cost
                 frontier.push(next_, new_cost)
-                came_from[next_] = current
+                if track_path:
+                    came_from_view[next_] = current
+
+    if stats is not None:
+        stats['expanded'] = expanded
+        stats['max_frontier'] = max_frontier
+    if cost_so_far[goal_index] < 0:
+        raise ValueError(f'{goal} cannot be reached from {start}')
+    return came_from, cost_so_far[goal_index]
+
+
+def _dial(grid: WeightedGrid, start_index: int, goal_indices: set[int] | None, track_path: bool,
+          stats: dict | None):
+    """
+    Run Dial's algorithm from a location until every goal has been reached, or until every location has been reached
+    if goal_indices is None. Locations are flat indices, as in dijkstra_search()
+    :return: tuple containing the NumPy array of predecessors (None if track_path is false) and the NumPy array of costs
+    (-1 for locations that were not reached). The costs of the goals are final; costs of other locations may not be
+    """
+    cols = grid.cols
+    size = grid.rows * cols
+    weights = grid.flat_weights()
+    costs = np.full(size, -1, np.int32)
+    cost_so_far = memoryview(costs)
+    came_from = np.full(size, -1, np.int32) if track_path else None
+    came_from_view = memoryview(came_from) if track_path else None
+    goals_left = len(goal_indices) if goal_indices is not None else -1
+    expanded = 0
+    buckets = [[] for _ in range(max(grid.max_weight(), 0) + 1)]
+    cost_so_far[start_index] = 0
+    buckets[0].append(start_index)
+    queued = 1
+    cost = 0
+
+    while queued and goals_left:
+        bucket = buckets[cost % len(buckets)]
+        while bucket:
+            current = bucket.pop()
+            queued -= 1
+            if cost_so_far[current] != cost:
+                continue  # a cheaper path to this location was found after it was queued
+            expanded += 1
+            if goal_indices is not None and current in goal_indices:
+                goals_left -= 1
+                if not goals_left:
+                    break
+            j = current % cols
+            for next_ in (current + cols if current + cols < size else -1, current + 1 if j + 1 < cols else -1,
+                          current - cols, current - 1 if j else -1):
+                if next_ < 0:
+                    continue
+                new_cost = cost + weights[next_]
+                old_cost = cost_so_far[next_]
+                if old_cost < 0 or new_cost < old_cost:
+                    cost_so_far[next_] = new_cost
+                    if track_path:
+                        came_from_view[next_] = current
+                    buckets[new_cost % len(buckets)].append(next_)
+                    queued += 1
+        cost += 1
+
+    if stats is not None:
+        stats['expanded'] = expanded
+    return came_from, costs
+
+
+def dial_search(grid: WeightedGrid, start: GridLocation = (0, 0), goal: GridLocation = None,
+                track_path: bool = True, stats: dict | None = None):
+    """
+    Same as dijkstra_search(), but using Dial's algorithm. The weights are small non-negative integers, so instead of a
+    heap, the frontier is kept in a circular array of buckets, one for each cost that can still be reached. A location
+    is pushed onto the bucket for its cost and popped in cost order by sweeping the buckets, so both are O(1)
+    :param grid: Grid to search
+    :param start: Location to start from
+    :param goal: Location to find the cheapest path to. Defaults to the bottom right corner
+    :param track_path: If false, predecessors are not tracked, which saves memory when only the cost is needed
+    :param stats: If given, the number of locations expanded by the search is stored in it under 'expanded'
+    :return: Same as dijkstra_search()
+    """
+    if goal is None:
+        goal = (grid.rows - 1, grid.cols - 1)
+    goal_index = goal[0] * grid.cols + goal[1]
+    came_from, costs = _dial(grid, start[0] * grid.cols + start[1], {goal_index}, track_path, stats)
+    if costs[goal_index] < 0:
+        raise ValueError(f'{goal} cannot be reached from {start}')
+    return came_from, int(costs[goal_index])
+
+
+def astar_search(grid: WeightedGrid, start: GridLocation = (0, 0), goal: GridLocation = None,
+                 track_path: bool = True, stats: dict | None = None):
+    """
+    Same as dijkstra_search(), but using A*. Locations are taken from the frontier in order of their cost plus an
+    estimate of the cost from there to the goal: the Manhattan distance to the goal times the minimum weight in the grid.
+    The estimate never overestimates the cost, and changes by no more than the weight of a step, so the first path
+    found to each location is still the cheapest, but locations that lead away from the goal are expanded much later
+    :param grid: Grid to search
+    :param start: Location to start from
+    :param goal: Location to find the cheapest path to. Defaults to the bottom right corner
+    :param track_path: If false, predecessors are not tracked, which saves memory when only the cost is needed
+    :param stats: If given, the number of locations expanded by the search is stored in it under 'expanded'
+    :return: Same as dijkstra_search()
+    """
+    if goal is None:
+        goal = (grid.rows - 1, grid.cols - 1)
+    cols = grid.cols
+    size = grid.rows * cols
+    weights = grid.flat_weights()
+    min_weight = max(grid.min_weight(), 0)
+    goal_i, goal_j = goal
+    cost_so_far = memoryview(np.full(size, -1, np.int32))
+    came_from = np.full(size, -1, np.int32) if track_path else None
+    came_from_view = memoryview(came_from) if track_path else None
+    closed = bytearray(size)
+    frontier = PriorityQueue()
+    start_index = start[0] * cols + start[1]
+    goal_index = goal_i * cols + goal_j
+    frontier.push(start_index, 0)
+    cost_so_far[start_index] = 0
+    expanded = 0
+
+    while not frontier.empty():
+        current = frontier.pop()
+        if closed[current]:
+            continue  # a cheaper path to this location was found after it was queued
+        closed[current] = 1
+        expanded += 1
+        if current == goal_index:
+            break
+        j = current % cols
+        for next_ in (current + cols if current + cols < size else -1, current + 1 if j + 1 < cols else -1,
+                      current - cols, current - 1 if j else -1):
+            if next_ < 0:
+                continue
+            new_cost = cost_so_far[current] + weights[next_]
+            old_cost = cost_so_far[next_]
+            if old_cost < 0 or new_cost < old_cost:
+                cost_so_far[next_] = new_cost
+                i, j_ = divmod(next_, cols)
+                frontier.push(next_, new_cost + min_weight * (abs(i - goal_i) + abs(j_ - goal_j)))
+                if track_path:
+                    came_from_view[next_] = current
+
+    if stats is not None:
+        stats['expanded'] = expanded
+    if cost_so_far[goal_index] < 0:
+        raise ValueError(f'{goal} cannot be reached from {start}')
+    return came_from, cost_so_far[goal_index]
+
+
+def bidirectional_search(grid: WeightedGrid, start: GridLocation = (0, 0), goal: GridLocation = None,
+                         track_path: bool = True, stats: dict | None = None):
+    """
+    Same as dijkstra_search(), but searching forwards from the start and backwards from the goal at the same time,
+    expanding whichever frontier is cheaper. Moving into a location costs its weight, so the backward search finds the
+    cost of the cheapest path from each location to the goal, not counting the location itself. Whenever either search
+    finds a step from a location reached by the forward search to one reached by the backward search, it is a candidate
+    for the cheapest path. The search stops once the cheapest locations left in the two frontiers cost at least as much
+    as the best candidate together, since no path through them can be cheaper
+    :param grid: Grid to search
+    :param start: Location to start from
+    :param goal: Location to find the cheapest path to. Defaults to the bottom right corner
+    :param track_path: If false, predecessors are not tracked, which saves memory when only the cost is needed
+    :param stats: If given, the number of locations expanded by the search is stored in it under 'expanded'
+    :return: Same as dijkstra_search()
+    """
+    if goal is None:
+        goal = (grid.rows - 1, grid.cols - 1)
+    cols = grid.cols
+    size = grid.rows * cols
+    weights = grid.flat_weights()
+    start_index = start[0] * cols + start[1]
+    goal_index = goal[0] * cols + goal[1]
+    came_from = np.full(size, -1, np.int32) if track_path else None
+    # Forward search from the start, then backward search from the goal
+    costs = (memoryview(np.full(size, -1, np.int32)), memoryview(np.full(size, -1, np.int32)))
+    links = (memoryview(came_from) if track_path else None,
+             memoryview(np.full(size, -1, np.int32)) if track_path else None)
+    closed = (bytearray(size), bytearray(size))
+    frontiers = (PriorityQueue(), PriorityQueue())
+    for side, index in enumerate((start_index, goal_index)):
+        costs[side][index] = 0
+        frontiers[side].push(index, 0)
+    best = 0 if start_index == goal_index else None
+    meeting = None  # step (from, to) on the best path found so far
+    expanded = 0
+
+    while not frontiers[0].empty() and not frontiers[1].empty():
+        forward_priority = frontiers[0].peek_priority()
+        backward_priority = frontiers[1].peek_priority()
+        if best is not None and forward_priority + backward_priority >= best:
+            break
+        side = 0 if forward_priority <= backward_priority else 1
+        cost_so_far, other_cost = costs[side], costs[1 - side]
+        current = frontiers[side].pop()
+        if closed[side][current]:
+            continue  # a cheaper path to this location was found after it was queued
+        closed[side][current] = 1
+        expanded += 1
+        # Going backwards, the step into current costs its weight, wherever it is taken from
+        step_cost = weights[current] if side else 0
+        j = current % cols
+        for next_ in (current + cols if current + cols < size else -1, current + 1 if j + 1 < cols else -1,
+                      current - cols, current - 1 if j else -1):
+            if next_ < 0:
+                continue
+            new_cost = cost_so_far[current] + (step_cost if side else weights[next_])
+            old_cost = cost_so_far[next_]
+            if old_cost < 0 or new_cost < old_cost:
+                cost_so_far[next_] = new_cost
+                frontiers[side].push(next_, new_cost)
+                if track_path:
+                    links[side][next_] = current
+            if other_cost[next_] >= 0 and (best is None or new_cost + other_cost[next_] < best):
+                best = new_cost + other_cost[next_]
+                meeting = (next_, current) if side else (current, next_)
+
+    if stats is not None:
+        stats['expanded'] = expanded
+    if best is None:
+        raise ValueError(f'{goal} cannot be reached from {start}')
+    if track_path and meeting is not None:
+        # Join the backward search's path onto the forward search's predecessors
+        previous, current = meeting
+        came_from[current] = previous
+        while current != goal_index:
+            current, previous = links[1][current], current
+            came_from[current] = previous
+    return came_from, best
+
+
+# Grid rebuilt from shared memory in a worker process of _pooled_costs_from(), and the shared memory it uses
+_shared_grid: WeightedGrid | None = None
+_shared_memory: SharedMemory | None = None
+
+
+def _attach_shared_grid(name: str, shape: tuple[int, int], tiles: tuple[int, int] | None):
+    """Rebuild the grid in a worker process from the weights in shared memory, without copying them"""
+    global _shared_grid, _shared_memory
+    _shared_memory = SharedMemory(name)
+    _shared_grid = WeightedGrid(np.ndarray(shape, np.int32, _shared_memory.buf), copy=False)
+    if tiles is not None:
+        _shared_grid = TiledWeightedGrid(_shared_grid, *tiles)
+
+
+def _shared_costs_from(search_: tuple[GridLocation, list[GridLocation]]) -> list[int]:
+    return _shared_grid.costs_from(*search_)
+
+
+def _pooled_costs_from(grid: WeightedGrid, searches: list[tuple[GridLocation, list[GridLocation]]],
+                       workers: int) -> list[list[int]]:
+    """Run WeightedGrid.costs_from() for each (start, goals) pair across a pool of processes"""
+    weights, tiles = grid._shared_parts()
+    weights = np.ascontiguousarray(weights, np.int32)
+    memory = SharedMemory(create=True, size=max(weights.nbytes, 1))
+    try:
+        np.ndarray(weights.shape, np.int32, memory.buf)[:] = weights
+        with ProcessPoolExecutor(workers, initializer=_attach_shared_grid,
+                                 initargs=(memory.name, weights.shape, tiles)) as executor:
+            return list(executor.map(_shared_costs_from, searches, chunksize=max(len(searches) // (workers * 4), 1)))
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+def reconstruct_path(grid: WeightedGrid, came_from, start: GridLocation = (0, 0),
+                     goal: GridLocation = None) -> list[GridLocation]:
+    """
+    Rebuild the cheapest path found by a search from its array of predecessors
+    :param grid: Grid that was searched
+    :param came_from: Array of predecessors returned by the search
+    :param start: Location the search started from
+    :param goal: Location the path leads to. Defaults to the bottom right corner
+    :return: List of the locations on the path, from start to goal
+    """
+    if goal is None:
+        goal = (grid.rows - 1, grid.cols - 1)
+    cols = grid.cols
+    start_index = start[0] * cols + start[1]
+    index = goal[0] * cols + goal[1]
+    path = [index]
+    while index != start_index:
+        if (index := int(came_from[index])) < 0:
+            raise ValueError(f'{goal} was not reached from {start}')
+        path.append(index)
+    return [divmod(index, cols) for index in reversed(path)]
+
+
+# Engines that search() can use
+SEARCH_ENGINES = {
+    'dijkstra': dijkstra_search,
+    'dijkstra_indexed': partial(dijkstra_search, indexed_queue=True),
+    'dial': dial_search,
+    'astar': astar_search,
+    'bidirectional': bidirectional_search,
+}
+
 
-    return came_from, cost_so_far[goal]
+def search(grid: WeightedGrid, start: GridLocation = (0, 0), goal: GridLocation = None, engine: str = 'dijkstra',
+           track_path: bool = True, stats: dict | None = None):
+    """
+    Find the cheapest path between two locations in a grid
+    :param grid: Grid to search
+    :param start: Location to start from
+    :param goal: Location to find the cheapest path to. Defaults to the bottom right corner
+    :param engine: Name of the engine used to search the grid. See SEARCH_ENGINES. Every engine gives the same cost
+    :param track_path: If false, predecessors are not tracked, which saves memory when only the cost is needed
+    :param stats: If given, the number of locations expanded by the search is stored in it under 'expanded'
+    :return: Same as dijkstra_search()
+    """
+    return SEARCH_ENGINES[engine](grid, start, goal, track_path, stats)
@@ -0,0 +1,289 @@
+"""Tests and benchmarks for the search engines in grid.py"""
+
+import numpy as np
+import os
+import tempfile
+from timeit import timeit
+import tracemalloc
+
+from grid import IndexedPriorityQueue, SEARCH_ENGINES, TiledWeightedGrid, WeightedGrid, reconstruct_path, search
+from option_selection import OptionSelector
+from testing import test_bed
+
+
+EXAMPLE = """1163751742
+1381373672
+2136511328
+3694931569
+7463417111
+1319128137
+1359912421
+3125421639
+1293138521
+2311944581
+"""
+
+
+def example_grid() -> WeightedGrid:
+    """Read the example grid from a file, to exercise WeightedGrid.from_file()"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'example.txt')
+        with open(path, 'w') as f:
+            f.write(EXAMPLE)
+        return WeightedGrid.from_file(path)
+
+
+def random_grid(rows: int, cols: int, seed: int = 0) -> WeightedGrid:
+    """
+    Generate a grid with random weights from 1 to 9
+    :param rows: Number of rows in the grid
+    :param cols: Number of columns in the grid
+    :param seed: Seed for the random number generator
+    :return: The grid
+    """
+    return WeightedGrid(np.random.default_rng(seed).integers(1, 10, (rows, cols)))
+
+
+def test_search_engines():
+    """Check that every engine finds the same cost as dijkstra_search() on the example and random grids"""
+    grids = [example_grid()] + [random_grid(rows, cols, seed) for seed, (rows, cols) in enumerate(
+        ((1, 1), (1, 20), (20, 1), (7, 13), (50, 50), (120, 80)))]
+    queries = [(grid, (0, 0), None) for grid in grids]
+    queries += [(grids[-1], (60, 40), (0, 0)), (grids[-2], (49, 0), (0, 49)), (grids[-2], (10, 10), (10, 10))]
+    expected = [search(*x)[1] for x in queries]
+    assert expected[0] == 40
+    for engine in SEARCH_ENGINES:
+        print(f'Engine: {engine}')
+        test_bed(lambda grid, start, goal: search(grid, start, goal, engine)[1], queries, expected)
+
+
+def test_reconstruct_path():
+    """Check that the rebuilt path runs between the right locations, in steps of 1, and adds up to the cost"""
+    def path_cost(grid: WeightedGrid, start, goal, engine: str) -> int:
+        came_from, cost = search(grid, start, goal, engine)
+        path = reconstruct_path(grid, came_from, start, goal)
+        assert path[0] == start and path[-1] == (goal or (grid.rows - 1, grid.cols - 1))
+        assert all(abs(i - k) + abs(j - m) == 1 for (i, j), (k, m) in zip(path, path[1:]))
+        assert search(grid, start, goal, engine, track_path=False) == (None, cost)
+        return sum(grid.weight(x) for x in path[1:])
+
+    grids = [random_grid(rows, cols, seed) for seed, (rows, cols) in enumerate(((1, 1), (9, 4), (50, 50)))]
+    queries = [(grid, (0, 0), None) for grid in grids] + [(grids[-1], (30, 45), (2, 7))]
+    inputs = [x + (engine,) for x in queries for engine in SEARCH_ENGINES]
+    test_bed(path_cost, inputs, [search(*x)[1] for x in inputs])
+
+
+def test_tiled_grid():
+    """Check tiled grids against the same grids fully expanded, with every engine"""
+    def compare(tiled: TiledWeightedGrid, engine: str) -> bool:
+        expanded = tiled.expand()
+        flat_weights = tiled.flat_weights()
+        assert [flat_weights[x] for x in range(tiled.rows * tiled.cols)] == expanded.weights.ravel().tolist()
+        assert (tiled.min_weight(), tiled.max_weight()) == (expanded.min_weight(), expanded.max_weight())
+        came_from, cost = search(tiled, engine=engine)
+        assert sum(tiled.weight(x) for x in reconstruct_path(tiled, came_from)[1:]) == cost
+        return cost == search(expanded, engine=engine)[1]
+
+    tiled = [TiledWeightedGrid(example_grid(), 5, 5), TiledWeightedGrid(random_grid(3, 4), 1, 1),
+             TiledWeightedGrid(random_grid(7, 5, 1), 3, 11), TiledWeightedGrid(random_grid(20, 20, 2), 10, 10)]
+    assert search(tiled[0])[1] == 315
+    inputs = [(grid, engine) for grid in tiled for engine in SEARCH_ENGINES]
+    test_bed(compare, inputs, [True] * len(inputs))
+
+
+def random_queries(grid: WeightedGrid, starts: int, goals: int, seed: int = 0) -> list[tuple[tuple, tuple]]:
+    """Generate random (start, goal) queries, with the given number of goals for each of the given number of starts"""
+    rng = np.random.default_rng(seed)
+    locations = [tuple(x) for x in rng.integers(0, (grid.rows, grid.cols), (starts * (goals + 1), 2)).tolist()]
+    queries = [(locations[k], goal) for k in range(starts) for goal in locations[starts + k * goals:][:goals]]
+    rng.shuffle(queries)
+    return [(tuple(start), tuple(goal)) for start, goal in queries]
+
+
+def test_batch_costs():
+    """Check batched and multi-goal queries against one search per query, in this process and across a pool"""
+    def compare(grid: WeightedGrid, queries, workers: int) -> bool:
+        costs = grid.batch_costs(queries, workers)
+        cost_map = grid.cost_map(queries[0][0])
+        assert all(cost_map[goal] == cost for (start, goal), cost in zip(queries, costs) if start == queries[0][0])
+        return costs == [search(grid, start, goal, 'dial', False)[1] for start, goal in queries]
+
+    grids = [random_grid(1, 1), random_grid(40, 30, 1), TiledWeightedGrid(random_grid(15, 20, 2), 3, 2)]
+    inputs = [(grid, queries, workers) for grid in grids for queries in (random_queries(grid, 1, 5),
+                                                                          random_queries(grid, 6, 4, 1))
+              for workers in (1, 2)]
+    test_bed(compare, inputs, [True] * len(inputs))
+
+
+def test_indexed_priority_queue():
+    """Check an IndexedPriorityQueue against a dict of priorities under random pushes, decreases and pops"""
+    def always_pops_minimum(capacity: int, operations: int, seed: int) -> bool:
+        rng = np.random.default_rng(seed)
+        queue = IndexedPriorityQueue(capacity)
+        expected: dict[int, int] = {}
+        for _ in range(operations):
+            item, priority = int(rng.integers(0, capacity)), int(rng.integers(0, 100))
+            if rng.random() < 0.3 and expected:
+                minimum = min(expected.values())
+                item = queue.pop()
+                if item in queue or expected.pop(item) != minimum:
+                    return False
+            elif item in expected and priority > expected[item]:
+                try:
+                    queue.decrease_key(item, priority)
+                    return False
+                except ValueError:
+                    pass
+            else:
+                queue.push(item, priority)
+                expected[item] = priority
+            if len(queue) != len(expected) or any(queue.priority(x) != y for x, y in expected.items()):
+                return False
+        while expected:
+            minimum = min(expected.values())
+            if expected.pop(queue.pop()) != minimum:
+                return False
+        return queue.empty()
+
+    inputs = [(1, 10, 0), (10, 200, 1), (100, 2000, 2), (1000, 5000, 3)]
+    test_bed(always_pops_minimum, inputs, [True] * len(inputs))
+
+
+def benchmark_search_engines():
+    """Compare the search engines on large random grids, searching from the top left to the bottom right corner"""
+    print(f'{"size":>11} {"engine":>9} {"cost":>7} {"time (s)":>10}')
+    for size in (250, 500, 1000, 2000):
+        grid = random_grid(size, size)
+        for engine in SEARCH_ENGINES:
+            cost = 0
+
+            def run():
+                nonlocal cost
+                cost = search(grid, engine=engine)[1]
+
+            time = timeit(run, number=1)
+            print(f'{f"{size}x{size}":>11} {engine:>9} {cost:>7} {time:>10.4f}')
+
+
+def benchmark_search_distances():
+    """
+    Compare the locations expanded and the time taken by the search engines on random grids, for goals at increasing
+    distances from a start in the top left quarter of the grid
+    """
+    print(f'{"size":>11} {"distance":>8} {"engine":>13} {"cost":>7} {"expanded":>9} {"time (s)":>10}')
+    for size in (250, 1000):
+        grid = random_grid(size, size)
+        start = (size // 4, size // 4)
+        for distance in (10, size // 4, size // 2, size):
+            # Split the distance between the rows and columns
+            goal = (start[0] + distance // 2, start[1] + distance - distance // 2)
+            for engine in SEARCH_ENGINES:
+                stats = {}
+                cost = 0
+
+                def run():
+                    nonlocal cost
+                    cost = search(grid, start, goal, engine, False, stats)[1]
+
+                time = timeit(run, number=1)
+                print(f'{f"{size}x{size}":>11} {distance:>8} {engine:>13} {cost:>7} {stats["expanded"]:>9} '
+                      f'{time:>10.4f}')
+
+
+def benchmark_priority_queues():
+    """Compare the largest size of the frontier and the throughput of Dijkstra's algorithm with each priority queue"""
+    print(f'{"size":>11} {"queue":>8} {"cost":>7} {"expanded":>9} {"max frontier":>12} {"time (s)":>10} '
+          f'{"expanded/s":>11}')
+    for size in (250, 500, 1000):
+        grid = random_grid(size, size)
+        for queue, engine in (('lazy', 'dijkstra'), ('indexed', 'dijkstra_indexed')):
+            stats = {}
+            cost = 0
+
+            def run():
+                nonlocal cost
+                cost = search(grid, engine=engine, track_path=False, stats=stats)[1]
+
+            time = timeit(run, number=1)
+            print(f'{f"{size}x{size}":>11} {queue:>8} {cost:>7} {stats["expanded"]:>9} {stats["max_frontier"]:>12} '
+                  f'{time:>10.4f} {stats["expanded"] / time:>11.0f}')
+
+
+def benchmark_search_memory():
+    """Measure the peak memory used by the search engines, with and without tracking predecessors"""
+    print(f'{"size":>11} {"engine":>9} {"track path":>10} {"peak memory (MiB)":>18}')
+    for size in (500, 1000):
+        grid = random_grid(size, size)
+        for engine in SEARCH_ENGINES:
+            for track_path in (True, False):
+                tracemalloc.start()
+                search(grid, engine=engine, track_path=track_path)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print(f'{f"{size}x{size}":>11} {engine:>9} {str(track_path):>10} {peak / 2 ** 20:>18.1f}')
+
+
+def benchmark_tiled_grid():
+    """Compare searching tiled grids with searching the same grids fully expanded"""
+    print(f'{"base":>9} {"tiles":>8} {"grid":>11} {"engine":>13} {"cost":>7} {"peak memory (MiB)":>18} '
+          f'{"time (s)":>10}')
+    for base_size, tiles in ((200, 5), (100, 10)):
+        base = random_grid(base_size, base_size)
+        tiled = TiledWeightedGrid(base, tiles, tiles)
+        for grid in (tiled, tiled.expand()):
+            for engine in ('dijkstra', 'dial'):
+                cost = 0
+
+                def run():
+                    nonlocal cost
+                    cost = search(grid, engine=engine, track_path=False)[1]
+
+                time = timeit(run, number=1)
+                tracemalloc.start()
+                if grid is tiled:
+                    run()
+                else:
+                    tiled.expand()
+                    run()
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                label = f'{tiles}x{tiles}' if grid is tiled else 'expanded'
+                print(f'{f"{base_size}x{base_size}":>9} {label:>8} {f"{grid.rows}x{grid.cols}":>11} {engine:>13} '
+                      f'{cost:>7} {peak / 2 ** 20:>18.1f} {time:>10.4f}')
+
+
+def benchmark_batch_costs():
+    """Compare one search per query with batched queries, in this process and across pools of processes"""
+    cpus = os.cpu_count() or 1
+    print(f'{cpus} CPU(s) available')
+    print(f'{"grid":>11} {"starts":>6} {"goals":>6} {"method":>12} {"time (s)":>10}')
+    for size, starts, goals in ((300, 16, 1), (300, 16, 32), (600, 16, 8)):
+        grid = random_grid(size, size)
+        queries = random_queries(grid, starts, goals)
+        methods = {'per query': lambda: [search(grid, start, goal, 'dial', False) for start, goal in queries]}
+        for workers in sorted({1, 2, 4, cpus}):
+            methods[f'{workers} worker(s)'] = lambda workers=workers: grid.batch_costs(queries, workers)
+        for method, run in methods.items():
+            time = timeit(run, number=1)
+            print(f'{f"{size}x{size}":>11} {starts:>6} {goals:>6} {method:>12} {time:>10.4f}')
+
+
+def main():
+    print('Grid search engines')
+    selector = OptionSelector()
+    selector.add_option('t', 'test search engines', test_search_engines)
+    selector.add_option('tp', 'test path reconstruction', test_reconstruct_path)
+    selector.add_option('tt', 'test tiled grids', test_tiled_grid)
+    selector.add_option('tb', 'test batched queries', test_batch_costs)
+    selector.add_option('tq', 'test indexed priority queue', test_indexed_priority_queue)
+    selector.add_option('b', 'benchmark search engines', benchmark_search_engines)
+    selector.add_option('bd', 'benchmark search engines by distance', benchmark_search_distances)
+    selector.add_option('bq', 'benchmark priority queues', benchmark_priority_queues)
+    selector.add_option('bm', 'benchmark search memory', benchmark_search_memory)
+    selector.add_option('bt', 'benchmark tiled grids', benchmark_tiled_grid)
+    selector.add_option('bb', 'benchmark batched queries', benchmark_batch_costs)
+    selector.run()
+
+
+if __name__ == '__main__':
+    main()
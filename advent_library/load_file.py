@@ -1,16 +1,111 @@
 from ast import literal_eval
+from itertools import islice
+import mmap
+import os
+from typing import Iterable, Iterator, TypeVar
 
+import numpy as np
+import numpy.typing as npt
 
-def as_digit_grid(file_name):
+T = TypeVar('T')
+
+
+def iter_strings(file_name) -> Iterator[str]:
+    """Lazily read the lines of a file, one at a time, with surrounding whitespace stripped"""
     with open(file_name) as f:
-        return [[int(y) for y in x.strip()] for x in f.readlines()]
+        for x in f:
+            yield x.strip()
+
+
+def iter_literals(file_name) -> Iterator:
+    """Lazily read a Python literal from each line of a file, one line at a time"""
+    return (literal_eval(x) for x in iter_strings(file_name))
+
+
+def iter_digit_grid(file_name) -> Iterator[list[int]]:
+    """Lazily read each row of a grid of digits as a list of ints, one row at a time"""
+    return ([int(y) for y in x] for x in iter_strings(file_name))
+
+
+def in_batches(records: Iterable[T], batch_size: int) -> Iterator[list[T]]:
+    """
+    Group records into lists of batch_size records, taking them from the iterable only as each list is needed
+    :param records: Records to group
+    :param batch_size: Number of records in each list. The last list may be shorter
+    :return: Generator of lists of records
+    """
+    if batch_size < 1:
+        raise ValueError(f'batch_size must be at least 1, got {batch_size}')
+    records = iter(records)
+    while batch := list(islice(records, batch_size)):
+        yield batch
+
+
+def string_batches(file_name, batch_size: int) -> Iterator[list[str]]:
+    """Same as iter_strings(), but yielding lists of batch_size lines"""
+    return in_batches(iter_strings(file_name), batch_size)
+
+
+def literal_batches(file_name, batch_size: int) -> Iterator[list]:
+    """Same as iter_literals(), but yielding lists of batch_size literals"""
+    return in_batches(iter_literals(file_name), batch_size)
+
+
+def digit_grid_batches(file_name, batch_size: int) -> Iterator[list[list[int]]]:
+    """Same as iter_digit_grid(), but yielding lists of batch_size rows"""
+    return in_batches(iter_digit_grid(file_name), batch_size)
+
+
+def as_digit_grid(file_name):
+    return list(iter_digit_grid(file_name))
+
+
+def as_digit_array(file_name) -> npt.NDArray[np.uint8]:
+    """
+    Read a grid of digits into a uint8 NumPy array, without creating a Python object for each digit. The file is
+    memory-mapped and viewed as a 2D array of bytes, using the position of the first newline as the row stride, so the
+    only copy made is the array of digits itself. Lines may end in \\n or \\r\\n, but must all be the same length
+    :param file_name: Path to the file
+    :return: 2D uint8 array of the digits
+    """
+    with open(file_name, 'rb') as f:
+        if not (size := os.fstat(f.fileno()).st_size):
+            return np.zeros((0, 0), np.uint8)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            while size and data[size - 1] in b'\r\n':
+                size -= 1
+            if not size:
+                return np.zeros((0, 0), np.uint8)
+            if (width := data.find(b'\n', 0, size)) < 0:
+                width = stride = size  # a single row
+            else:
+                stride = width + 1
+                if width and data[width - 1] == ord('\r'):
+                    width -= 1
+            if not width:
+                raise ValueError(f'{file_name} starts with an empty line')
+            # The last row has no line ending, since trailing line endings were skipped
+            rows = (size - width) // stride + 1
+            raw = np.frombuffer(data, np.uint8, size)
+            # Every row but the last must end in a line ending exactly one stride after the previous one
+            ragged = (rows - 1) * stride + width != size
+            if rows > 1:
+                ragged = ragged or (raw[stride - 1::stride] != ord('\n')).any()
+                if stride - width == 2:
+                    ragged = ragged or (raw[stride - 2::stride] != ord('\r')).any()
+            if ragged:
+                del raw
+                raise ValueError(f'{file_name} does not have rows of {width} characters')
+            digits = np.lib.stride_tricks.as_strided(raw, (rows, width), (stride, 1)) - ord('0')
+            del raw  # release the view of the memory map so it can be closed
+    if digits.size and digits.max() > 9:
+        raise ValueError(f'{file_name} contains characters other than digits')
+    return digits
 
 
 def as_literals(file_name):
-    with open(file_name) as f:
-        return [literal_eval(x.strip()) for x in f.readlines()]
+    return list(iter_literals(file_name))
 
 
 def as_strings(file_name):
-    with open(file_name) as f:
-        return [x.strip() for x in f.readlines()]
+    return list(iter_strings(file_name))
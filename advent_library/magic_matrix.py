@@ -1,41 +1,310 @@
+from copy import copy
+from io import StringIO
+from itertools import repeat
+from typing import BinaryIO, TextIO
+
 Coordinate2D = tuple[int, int]
 
+CHUNK_BITS = 6
+CHUNK_SIZE = 1 << CHUNK_BITS
+CHUNK_MASK = CHUNK_SIZE - 1
+
+# A packed key holds a coordinate in a single int, as row * 2**32 + col. Columns must be in [MIN_COL, MAX_COL]. Adding
+# ROW_STEP to a packed key moves it down one row and adding 1 moves it right one column, so simulations can walk the
+# plane without building a tuple for every lookup
+PACK_SHIFT = 32
+ROW_STEP = 1 << PACK_SHIFT
+_PACK_HALF = 1 << (PACK_SHIFT - 1)
+MIN_COL = -_PACK_HALF
+MAX_COL = _PACK_HALF - 1
+
+
+def _column_error(col: int) -> ValueError:
+    return ValueError(f'column {col} is outside [{MIN_COL}, {MAX_COL}]')
+
+
+def pack(row: int, col: int) -> int:
+    """Pack a coordinate into a single int"""
+    if not MIN_COL <= col <= MAX_COL:
+        raise _column_error(col)
+    return (row << PACK_SHIFT) + col
+
+
+def unpack(key: int) -> Coordinate2D:
+    """Unpack a coordinate packed by pack()"""
+    row = (key + _PACK_HALF) >> PACK_SHIFT
+    return row, key - (row << PACK_SHIFT)
+
+
+def _as_list(values):
+    """Turn NumPy arrays into lists of Python ints, leaving any other iterable alone"""
+    return values.tolist() if hasattr(values, 'tolist') else values
+
 
 class MagicMatrix:
     """A 'magic matrix' that extends infinitely in all directions. Based on my AoC 2015 version, but with reduced
-    complexity and faster key lookups """
+    complexity and faster key lookups.
+
+    Rows are unbounded, but columns must be in [MIN_COL, MAX_COL], since each coordinate is stored as a single packed
+    int. Setting a cell outside that range raises a ValueError, and getting one gives the default value """
 
-    def __init__(self, default_value=None, contents: dict = None):
+    def __init__(self, default_value=None, contents: dict = None, occupancy_index: bool = False):
+        """
+        Constructor
+        :param default_value: Value of every key that has not been set
+        :param contents: Initial contents of the MagicMatrix
+        :param occupancy_index: If true, keep an index of which cells are set, with one bitmask per row. This allows
+        collision queries like is_blocked() and first_free_below() to use bit operations instead of lookups
+        """
         self.default_value = default_value
-        self.__max_content_length = 0
-        self.__contents = {}
+        self.__occupancy_index = occupancy_index
+        self.clear()
         if contents is not None:
             for k, v in contents.items():
                 self[k] = v
 
+    def clear(self):
+        """Remove every non-default value from the MagicMatrix"""
+        self.__max_content_length = 0
+        self.__contents = {}
+        # True if the contents dict may be shared with a fork. It is copied before it is next written to
+        self.__shared = False
+        self._clear_tracking()
+
+    def fork(self):
+        """
+        Make a copy of the MagicMatrix that shares its storage with this one. The storage is only copied once either
+        of them is written to, so forking a large MagicMatrix is cheap
+        :return: MagicMatrix of the same type
+        """
+        other = copy(self)
+        other.__row_counts = dict(self.__row_counts)
+        other.__col_counts = dict(self.__col_counts)
+        if self.__occupancy is not None:
+            other.__occupancy = dict(self.__occupancy)
+        self._share_storage(other)
+        return other
+
+    def _share_storage(self, other: 'MagicMatrix'):
+        """Give a shallow copy of this MagicMatrix its own view of the storage, to be copied on write"""
+        self.__shared = other.__shared = True
+
+    def snapshot(self):
+        """
+        Take a snapshot of the MagicMatrix that it can be rolled back to with restore(). Like fork(), this does not
+        copy the storage
+        :return: Snapshot to pass to restore()
+        """
+        return self.fork()
+
+    def restore(self, snapshot: 'MagicMatrix'):
+        """
+        Roll the MagicMatrix back to a snapshot. The snapshot is not affected, so it can be restored again later
+        :param snapshot: Snapshot taken by snapshot() on a MagicMatrix of the same type
+        :return: None
+        """
+        if type(snapshot) is not type(self):
+            raise TypeError(f'Cannot restore a {type(self).__name__} from a {type(snapshot).__name__}')
+        self.__dict__.update(snapshot.fork().__dict__)
+
+    def _clear_tracking(self):
+        # The bounding box is kept up to date as cells are written, so bounds queries don't have to scan every key.
+        # Deleting a cell on the edge of the box makes it stale; it is then rebuilt from the row and column counts the
+        # next time it is needed
+        self.__row_counts: dict[int, int] = {}
+        self.__col_counts: dict[int, int] = {}
+        self.__extents: tuple[int, int, int, int] | None = None
+        # Bit (col - occupancy_origin) of the mask for a row is set if (row, col) is set. The origin only moves left,
+        # when a cell left of it is set
+        self.__occupancy: dict[int, int] | None = {} if self.__occupancy_index else None
+        self.__occupancy_origin = 0
+
+    def _track_insert(self, row: int, col: int):
+        """Update the extents and occupancy index for a key that was not in the MagicMatrix before"""
+        if self.__occupancy is not None:
+            if not self.__row_counts:
+                self.__occupancy_origin = col
+            elif col < self.__occupancy_origin:
+                shift = self.__occupancy_origin - col
+                self.__occupancy = {k: v << shift for k, v in self.__occupancy.items()}
+                self.__occupancy_origin = col
+            self.__occupancy[row] = self.__occupancy.get(row, 0) | 1 << (col - self.__occupancy_origin)
+        self.__row_counts[row] = self.__row_counts.get(row, 0) + 1
+        self.__col_counts[col] = self.__col_counts.get(col, 0) + 1
+        if self.__extents is not None:
+            top, left, bottom, right = self.__extents
+            if row < top or row > bottom or col < left or col > right:
+                self.__extents = min(top, row), min(left, col), max(bottom, row), max(right, col)
+        elif len(self.__row_counts) == 1 and len(self.__col_counts) == 1:  # This is the only key
+            self.__extents = row, col, row, col
+
+    def _track_delete(self, row: int, col: int):
+        """Update the extents and occupancy index for a key that was removed from the MagicMatrix"""
+        if self.__occupancy is not None:
+            self.__occupancy[row] &= ~(1 << (col - self.__occupancy_origin))
+        self.__row_counts[row] -= 1
+        if self.__row_counts[row] == 0:
+            del self.__row_counts[row]
+            if self.__occupancy is not None:
+                del self.__occupancy[row]
+            if self.__extents is not None and row in (self.__extents[0], self.__extents[2]):
+                self.__extents = None
+        self.__col_counts[col] -= 1
+        if self.__col_counts[col] == 0:
+            del self.__col_counts[col]
+            if self.__extents is not None and col in (self.__extents[1], self.__extents[3]):
+                self.__extents = None
+
     def __getitem__(self, key: Coordinate2D):
-        if key in self.__contents:
-            return self.__contents[key]
-        return self.default_value
+        row, col = key
+        if not MIN_COL <= col <= MAX_COL:
+            return self.default_value
+        return self.__contents.get((row << PACK_SHIFT) + col, self.default_value)
 
     def __setitem__(self, key: Coordinate2D, value):
+        row, col = key
+        self.set(row, col, value)
+
+    def __delitem__(self, key: Coordinate2D):
+        row, col = key
+        if not MIN_COL <= col <= MAX_COL:
+            raise KeyError(key)
+        if self.__shared:
+            self.__contents = dict(self.__contents)
+            self.__shared = False
+        try:
+            del self.__contents[(row << PACK_SHIFT) + col]
+        except KeyError:
+            raise KeyError(key) from None
+        self._track_delete(row, col)
+
+    def get(self, row: int, col: int):
+        """Get the value at (row, col) without building a tuple key"""
+        if not MIN_COL <= col <= MAX_COL:
+            return self.default_value
+        return self.__contents.get((row << PACK_SHIFT) + col, self.default_value)
+
+    def set(self, row: int, col: int, value):
+        """Set the value at (row, col) without building a tuple key"""
+        if not MIN_COL <= col <= MAX_COL:
+            raise _column_error(col)
+        key = (row << PACK_SHIFT) + col
+        if self.__shared:
+            self.__contents = dict(self.__contents)
+            self.__shared = False
+        if key not in self.__contents:
+            self._track_insert(row, col)
+        self.__contents[key] = value
+        self.__max_content_length = max(self.__max_content_length, len(str(value)))
+
+    def get_packed(self, key: int):
+        """Get the value at a key packed by pack(). Every int is the packed key of a cell whose column is in range"""
+        return self.__contents.get(key, self.default_value)
+
+    def set_packed(self, key: int, value):
+        """Set the value at a key packed by pack(). Every int is the packed key of a cell whose column is in range, since
+        pack() rejects columns outside it"""
+        if self.__shared:
+            self.__contents = dict(self.__contents)
+            self.__shared = False
+        if key not in self.__contents:
+            self._track_insert(*unpack(key))
         self.__contents[key] = value
         self.__max_content_length = max(self.__max_content_length, len(str(value)))
 
+    def get_many(self, rows, cols) -> list:
+        """
+        Get the values at many coordinates at once
+        :param rows: Row of each coordinate. May be any iterable of ints, including a NumPy array
+        :param cols: Column of each coordinate, in the same form as rows
+        :return: list of values, in the same order as the coordinates
+        """
+        get = self.__contents.get
+        default_value = self.default_value
+        return [get((row << PACK_SHIFT) + col, default_value) if MIN_COL <= col <= MAX_COL else default_value
+                for row, col in zip(_as_list(rows), _as_list(cols))]
+
+    def set_many(self, rows, cols, values):
+        """
+        Set the values at many coordinates at once
+        :param rows: Row of each coordinate. May be any iterable of ints, including a NumPy array
+        :param cols: Column of each coordinate, in the same form as rows
+        :param values: Value to set at each coordinate. Use itertools.repeat to set every coordinate to the same value
+        :return: None
+        """
+        set_ = self.set
+        for row, col, value in zip(_as_list(rows), _as_list(cols), values):
+            set_(row, col, value)
+
+    @property
+    def has_occupancy_index(self) -> bool:
+        return self.__occupancy is not None
+
+    def __row_bits(self, row: int, col: int, count: int) -> int:
+        """Get the occupancy bits of count cells in a row, starting at col"""
+        if self.__occupancy is None:
+            raise ValueError('This MagicMatrix was not created with an occupancy index')
+        shift = col - self.__occupancy_origin
+        mask = self.__occupancy.get(row, 0)
+        mask = mask >> shift if shift >= 0 else mask << -shift
+        return mask & ((1 << count) - 1)
+
+    def is_blocked(self, row: int, col: int) -> bool:
+        """Check if (row, col) has been set, using the occupancy index"""
+        return self.__row_bits(row, col, 1) == 1
+
+    # Indexed by the occupancy bits of the cells down-left, down, and down-right of a cell, from lowest to highest bit.
+    # Gives the column offset of the first free cell in the order down, down-left, down-right
+    __first_free_offsets = (0, 0, -1, 1, 0, 0, -1, None)
+
+    def first_free_below(self, row: int, col: int) -> int | None:
+        """
+        Find where something at (row, col) falls, using the occupancy index. The cells directly below, below and to the
+        left, and below and to the right are tried in that order
+        :param row: Row of the falling cell
+        :param col: Column of the falling cell
+        :return: Column of the first free cell in the next row, or None if all three cells are blocked
+        """
+        offset = self.__first_free_offsets[self.__row_bits(row + 1, col - 1, 3)]
+        return None if offset is None else col + offset
+
+    def free_cells(self, row: int, start: int, stop: int) -> list[int]:
+        """
+        Find every free cell in part of a row, using the occupancy index. As with range(), the part is empty if stop is
+        not greater than start
+        :param row: Row to search
+        :param start: First column to search
+        :param stop: Column after the last column to search
+        :return: list of free columns in ascending order, which is empty for an empty part
+        """
+        count = max(stop - start, 0)
+        free = ~self.__row_bits(row, start, count) & ((1 << count) - 1)
+        result = []
+        while free:
+            lowest = free & -free
+            result.append(start + lowest.bit_length() - 1)
+            free ^= lowest
+        return result
+
     def range(self):
         """
         Get ranges that start and end at the extents of the MagicMatrix
         :return: tuple[range, range]
         """
-        row_range = range(min(self.__contents), max(self.__contents) + 1)
-        return row_range, range(min(self.__contents, key=lambda t: t[1]), max(self.__contents, key=lambda t: t[1]) + 1)
+        top, left, bottom, right = self.extents()
+        return range(top, bottom + 1), range(left, right + 1)
 
     def extents(self):
-        top = min(self.__contents)[0]
-        left = min(self.__contents, key=lambda t: t[1])[1]
-        bottom = max(self.__contents)[0]
-        right = max(self.__contents, key=lambda t: t[1])[1]
-        return top, left, bottom, right
+        """
+        Get the bounding box of every non-default key in the MagicMatrix
+        :return: tuple[int, int, int, int] containing the top, left, bottom, and right extents, in that order
+        """
+        if self.__extents is None:
+            if not self.__row_counts:
+                raise ValueError('An empty MagicMatrix has no extents')
+            self.__extents = (min(self.__row_counts), min(self.__col_counts),
+                              max(self.__row_counts), max(self.__col_counts))
+        return self.__extents
 
     def __iter__(self):
         """
@@ -50,7 +319,7 @@ class MagicMatrix:
         Iterate over every non-default key in the MagicMatrix. The order of the keys is undefined
         :return: iterator[Coordinate2D]
         """
-        return self.__contents.keys()
+        return map(unpack, self.__contents.keys())
 
     def values(self):
         """
@@ -59,24 +328,188 @@ class MagicMatrix:
         """
         return self.__contents.values()
 
+    def items(self):
+        """
+        Iterate over every non-default key in the MagicMatrix along with its value. The order is undefined
+        :return: iterator[tuple[Coordinate2D, any]]
+        """
+        return ((unpack(k), v) for k, v in self.__contents.items())
+
+    def _content_width(self):
+        """Length of the longest string representation of any value in the MagicMatrix"""
+        return self.__max_content_length
+
     def __repr__(self):
-        return f'MagicMatrix({self.default_value}, {self.__contents})'
+        return f'{type(self).__name__}({self.default_value}, {dict(self.items())})'
 
     def __str__(self):
+        sink = StringIO()
+        self.write_text(sink)
+        return sink.getvalue()[:-1]
+
+    def write_text(self, sink: TextIO):
+        """
+        Write a picture of the MagicMatrix to a text sink one row at a time, so that very large matrices can be written
+        out without building the whole picture in memory. The picture is the same as str() gives, plus a final newline
+        :param sink: File-like object to write to, such as sys.stdout or a file opened in text mode
+        :return: None
+        """
         top, left, bottom, right = self.extents()
-        i_range = range(top, bottom + 1)
         j_range = range(left, right + 1)
-        col_width = max(len(str(right)), len(str(left)), self.__max_content_length) + 1
+        col_width = max(len(str(right)), len(str(left)), self._content_width()) + 1
         row_width = max(len(str(bottom)), len(str(top)))
 
-        res = ' ' * (row_width + 1) + ''.join((str(j).ljust(col_width) for j in j_range)) + '\n'
-        res += '\n'.join(
-            [str(i).rjust(row_width) + ' ' + ''.join(
-                [str(c if (c := self[i, j]) is not None else '.').ljust(col_width) for j in j_range]
-            ) for i in i_range]
-        )
+        sink.write(' ' * (row_width + 1) + ''.join((str(j).ljust(col_width) for j in j_range)) + '\n')
+        for i in range(top, bottom + 1):
+            sink.write(str(i).rjust(row_width) + ' ' + ''.join(
+                [str(c if c is not None else '.').ljust(col_width) for c in self.get_many(repeat(i), j_range)]
+            ) + '\n')
+
+    def write_pnm(self, sink: BinaryIO, colours: dict, background: int | tuple[int, int, int] = 0):
+        """
+        Write a picture of the MagicMatrix to a binary sink as a PGM or PPM image, one row at a time. Each cell within
+        the extents is one pixel
+        :param sink: File-like object to write to, such as a file opened in binary mode
+        :param colours: Colour of each value in the MagicMatrix. Colours are either grey levels from 0 to 255, which
+        gives a PGM image, or (red, green, blue) tuples, which gives a PPM image. Every value that has been set must have
+        a colour
+        :param background: Colour of cells that have not been set, in the same form as the colours
+        :return: None
+        """
+        grey = isinstance(background, int)
+        if any(isinstance(x, int) != grey for x in colours.values()):
+            raise ValueError('Cannot mix grey levels and (red, green, blue) colours in one picture')
+        to_bytes = (lambda c: bytes((c,))) if grey else bytes
+        pixels = {k: to_bytes(v) for k, v in colours.items()}
+        background = to_bytes(background)
 
-        return res
+        top, left, bottom, right = self.extents()
+        j_range = range(left, right + 1)
+        sink.write(f'{"P5" if grey else "P6"}\n{len(j_range)} {bottom - top + 1}\n255\n'.encode('ascii'))
+        for i in range(top, bottom + 1):
+            sink.write(b''.join([pixels[c] if c is not None else background for c in self.get_many(repeat(i), j_range)]))
 
     def __len__(self):
         return len(self.__contents)
+
+
+class ChunkedMagicMatrix(MagicMatrix):
+    """A MagicMatrix that stores the plane as square chunks of CHUNK_SIZE x CHUNK_SIZE cells, which are created the
+    first time a cell inside them is written. Each cell is a single byte holding an index into a palette of the values
+    stored so far, so densely filled regions cost about one byte per cell instead of a dict entry and a tuple key.
+
+    Values must be hashable, and at most 255 distinct values may be stored """
+
+    def clear(self):
+        # Chunks are keyed by their packed chunk coordinates
+        self.__chunks: dict[int, bytearray] = {}
+        # Code 0 marks an empty cell. Codes are never reused, so the palette only grows
+        self.__palette = [None]
+        self.__codes = {}
+        self.__len = 0
+        # Keys of chunks that may be shared with a fork. Each is copied before it is next written to
+        self.__shared_chunks: set[int] = set()
+        self._clear_tracking()
+
+    def _share_storage(self, other: 'ChunkedMagicMatrix'):
+        other.__chunks = dict(self.__chunks)
+        other.__palette = list(self.__palette)
+        other.__codes = dict(self.__codes)
+        self.__shared_chunks = set(self.__chunks)
+        other.__shared_chunks = set(self.__chunks)
+
+    def __own_chunk(self, chunk_key: int) -> bytearray:
+        """Copy a shared chunk so it can be written to"""
+        self.__shared_chunks.discard(chunk_key)
+        chunk = self.__chunks[chunk_key] = bytearray(self.__chunks[chunk_key])
+        return chunk
+
+    def __code(self, value):
+        if (code := self.__codes.get(value)) is None:
+            if len(self.__palette) > 255:
+                raise ValueError('A ChunkedMagicMatrix can hold at most 255 distinct values')
+            code = self.__codes[value] = len(self.__palette)
+            self.__palette.append(value)
+        return code
+
+    def __getitem__(self, key: Coordinate2D):
+        row, col = key
+        return self.get(row, col)
+
+    def __setitem__(self, key: Coordinate2D, value):
+        row, col = key
+        self.set(row, col, value)
+
+    def __delitem__(self, key: Coordinate2D):
+        row, col = key
+        if not MIN_COL <= col <= MAX_COL:
+            raise KeyError(key)
+        chunk_key = ((row >> CHUNK_BITS) << PACK_SHIFT) + (col >> CHUNK_BITS)
+        chunk = self.__chunks.get(chunk_key)
+        offset = (row & CHUNK_MASK) << CHUNK_BITS | (col & CHUNK_MASK)
+        if chunk is None or not chunk[offset]:
+            raise KeyError(key)
+        if self.__shared_chunks and chunk_key in self.__shared_chunks:
+            chunk = self.__own_chunk(chunk_key)
+        chunk[offset] = 0
+        self.__len -= 1
+        self._track_delete(row, col)
+
+    def get(self, row: int, col: int):
+        if not MIN_COL <= col <= MAX_COL:
+            return self.default_value
+        chunk = self.__chunks.get(((row >> CHUNK_BITS) << PACK_SHIFT) + (col >> CHUNK_BITS))
+        if chunk is not None and (code := chunk[(row & CHUNK_MASK) << CHUNK_BITS | (col & CHUNK_MASK)]):
+            return self.__palette[code]
+        return self.default_value
+
+    def set(self, row: int, col: int, value):
+        if not MIN_COL <= col <= MAX_COL:
+            raise _column_error(col)
+        chunk_key = ((row >> CHUNK_BITS) << PACK_SHIFT) + (col >> CHUNK_BITS)
+        if (chunk := self.__chunks.get(chunk_key)) is None:
+            chunk = self.__chunks[chunk_key] = bytearray(CHUNK_SIZE * CHUNK_SIZE)
+        elif self.__shared_chunks and chunk_key in self.__shared_chunks:
+            chunk = self.__own_chunk(chunk_key)
+        offset = (row & CHUNK_MASK) << CHUNK_BITS | (col & CHUNK_MASK)
+        if not chunk[offset]:
+            self._track_insert(row, col)
+            self.__len += 1
+        chunk[offset] = self.__code(value)
+
+    def get_packed(self, key: int):
+        row = (key + _PACK_HALF) >> PACK_SHIFT
+        col = key - (row << PACK_SHIFT)
+        chunk = self.__chunks.get(((row >> CHUNK_BITS) << PACK_SHIFT) + (col >> CHUNK_BITS))
+        if chunk is not None and (code := chunk[(row & CHUNK_MASK) << CHUNK_BITS | (col & CHUNK_MASK)]):
+            return self.__palette[code]
+        return self.default_value
+
+    def set_packed(self, key: int, value):
+        row = (key + _PACK_HALF) >> PACK_SHIFT
+        self.set(row, key - (row << PACK_SHIFT), value)
+
+    def get_many(self, rows, cols) -> list:
+        get = self.get
+        return [get(row, col) for row, col in zip(_as_list(rows), _as_list(cols))]
+
+    def items(self):
+        for chunk_key, chunk in self.__chunks.items():
+            chunk_row, chunk_col = unpack(chunk_key)
+            top = chunk_row << CHUNK_BITS
+            left = chunk_col << CHUNK_BITS
+            for offset, code in enumerate(chunk):
+                if code:
+                    yield (top + (offset >> CHUNK_BITS), left + (offset & CHUNK_MASK)), self.__palette[code]
+
+    def keys(self):
+        return (key for key, _ in self.items())
+
+    def values(self):
+        return (value for _, value in self.items())
+
+    def _content_width(self):
+        return max((len(str(x)) for x in self.__palette[1:]), default=0)
+
+    def __len__(self):
+        return self.__len
@@ -0,0 +1,82 @@
+"""A parser for literals made of nested lists of non-negative integers, such as [1,[2,[]],3], that is much faster than
+eval() or ast.literal_eval(), since it does not go through the Python compiler"""
+
+import re
+
+# Integers, and any other character that is not whitespace
+_TOKENS = re.compile(r'\d+|\S')
+
+
+def parse_all(text: str) -> list:
+    """
+    Parse every literal in a string, in a single pass over it. Literals may be separated by any amount of whitespace
+    :param text: String containing the literals
+    :return: List of the parsed literals
+    """
+    literals = []
+    stack = []
+    current = None  # list currently being filled, or None between literals
+    # Whether the last token inside the current list was a value, which must be followed by ',' or ']', or a ',',
+    # which must be followed by a value. After '[', either a value or ']' may follow
+    after_value = False
+    after_comma = False
+    for token in _TOKENS.findall(text):
+        if token == '[':
+            if after_value:
+                raise ValueError("missing ','")
+            new = []
+            if current is not None:
+                current.append(new)
+                stack.append(current)
+            current = new
+            after_value = after_comma = False
+        elif token == ']':
+            if current is None or after_comma:
+                raise ValueError("unexpected ']'")
+            if stack:
+                current = stack.pop()
+                after_value = True
+            else:
+                literals.append(current)
+                current = None
+                after_value = False
+        elif token == ',':
+            if not after_value:
+                raise ValueError("unexpected ','")
+            after_value = False
+            after_comma = True
+        elif token.isdigit():
+            if current is None:
+                raise ValueError(f'unexpected {token!r} outside a list')
+            if after_value:
+                raise ValueError("missing ','")
+            current.append(int(token))
+            after_value = True
+            after_comma = False
+        else:
+            raise ValueError(f'unexpected {token!r}')
+    if current is not None:
+        raise ValueError("missing ']'")
+    return literals
+
+
+def parse(text: str) -> list:
+    """
+    Parse a single literal
+    :param text: String containing the literal
+    :return: The parsed literal
+    """
+    literals = parse_all(text)
+    if len(literals) != 1:
+        raise ValueError(f'expected 1 literal, found {len(literals)}')
+    return literals[0]
+
+
+def parse_file(file_name) -> list:
+    """
+    Parse every literal in a file, in a single call
+    :param file_name: Path to the file
+    :return: List of the parsed literals
+    """
+    with open(file_name) as f:
+        return parse_all(f.read())
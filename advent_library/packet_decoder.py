@@ -1,3 +1,7 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+from typing import Iterable, Iterator
+
 nibble_to_bits = {
     '0': '0000',
     '1': '0001',
@@ -25,6 +29,61 @@ def prod(args):
     return result
 
 
+class BitReader:
+    """
+    Reads fields of bits from a hex string in order. The hex is converted to bytes once, and a cursor tracks the position
+    of the next bit, so each field is read from the few bytes it covers instead of slicing a string of the bits after it
+    """
+    def __init__(self, packet: str):
+        self.size = 4 * len(packet)
+        self.data = bytes.fromhex(packet if len(packet) % 2 == 0 else packet + '0')
+        self.position = 0
+
+    def read_int(self, count: int) -> int:
+        """Read the next count bits as an unsigned integer"""
+        start = self.position
+        end = self.position = start + count
+        if end > self.size:
+            raise ValueError(f'cannot read {count} bits at bit {start} of {self.size}')
+        last_byte = (end + 7) >> 3
+        chunk = int.from_bytes(self.data[start >> 3:last_byte], 'big')
+        return (chunk >> ((last_byte << 3) - end)) & ((1 << count) - 1)
+
+    def read_bool(self) -> bool:
+        return bool(self.read_int(1))
+
+    def remaining_bits(self) -> str:
+        """Get the bits after the cursor as a string of '0's and '1's"""
+        count = self.size - self.position
+        return format(self.read_int(count), f'0{count}b') if count else ''
+
+
+class FlatPacket:
+    """
+    A parse tree stored as a flat post-order array of packets: every packet comes after all of its sub-packets. The array
+    is kept as parallel lists, with one entry per packet in each
+    """
+    __slots__ = ('versions', 'type_ids', 'values', 'child_counts')
+
+    def __init__(self):
+        self.versions: list[int] = []
+        self.type_ids: list[int] = []
+        self.values: list[int] = []  # literal value of each literal packet, or 0 for operators
+        self.child_counts: list[int] = []  # number of direct sub-packets of each operator, or 0 for literals
+
+    def append(self, version: int, type_id: int, value: int, child_count: int):
+        self.versions.append(version)
+        self.type_ids.append(type_id)
+        self.values.append(value)
+        self.child_counts.append(child_count)
+
+    def __len__(self) -> int:
+        return len(self.type_ids)
+
+    def version_sum(self) -> int:
+        return sum(self.versions)
+
+
 class PacketDecoder:
 
     # ------------------------------
@@ -99,10 +158,109 @@ class PacketDecoder:
                 return parse_tree, bits
 
     @staticmethod
-    def parse(packet):
+    def parse_by_slicing(packet):
+        """
+        Same as parse(), but converting the packet to a string of bits and slicing off each field as it is read. Each
+        slice copies the rest of the string, so this takes quadratic time; it is kept for comparison
+        """
         packet_bin = PacketDecoder.__hex_to_bin(packet)
         return PacketDecoder.__parse_bin(packet_bin)
 
+    @staticmethod
+    def __read_literal_from(reader: BitReader):
+        value = 0
+        while True:
+            group = reader.read_int(5)
+            value = (value << 4) | (group & 0b1111)
+            if not group & 0b10000:
+                return value
+
+    @staticmethod
+    def __parse_from(reader: BitReader, parse_tree: list):
+        version = reader.read_int(3)
+        type_id = reader.read_int(3)
+        if type_id == 4:  # Literal
+            parse_tree.append({
+                'version': version,
+                'type_id': type_id,
+                'literal_value': PacketDecoder.__read_literal_from(reader),
+            })
+            return
+        # Operator
+        sub_parse_tree = []
+        if not reader.read_bool():
+            length = reader.read_int(15)
+            end = reader.position + length
+            while reader.position < end:
+                PacketDecoder.__parse_from(reader, sub_parse_tree)
+        else:
+            for _ in range(reader.read_int(11)):
+                PacketDecoder.__parse_from(reader, sub_parse_tree)
+        parse_tree.append({
+            'version': version,
+            'type_id': type_id,
+            'sub-packets': sub_parse_tree,
+        })
+
+    @staticmethod
+    def parse(packet):
+        """
+        Parse a packet
+        :param packet: Packet as a string of hex digits
+        :return: tuple containing the parse tree, as a list holding the outermost packet, and the bits left over after it
+        as a string of '0's and '1's
+        """
+        reader = BitReader(packet)
+        parse_tree = []
+        PacketDecoder.__parse_from(reader, parse_tree)
+        return parse_tree, reader.remaining_bits()
+
+    @staticmethod
+    def parse_flat(packet) -> FlatPacket:
+        """
+        Parse the outermost packet in a transmission into a FlatPacket, without recursion. Each operator that is still
+        reading its sub-packets is kept on an explicit stack, with its child count so far, until its sub-packets are
+        all read. Then it is added after them
+        :param packet: Packet as a string of hex digits
+        :return: The parse tree as a FlatPacket
+        """
+        reader = BitReader(packet)
+        read_int = reader.read_int
+        flat = FlatPacket()
+        # [version, type ID, True if limited by count, sub-packet count or end position, sub-packets read so far]
+        stack = []
+        while True:
+            version = read_int(3)
+            type_id = read_int(3)
+            if type_id == 4:  # Literal
+                value = 0
+                while True:
+                    group = read_int(5)
+                    value = (value << 4) | (group & 0b1111)
+                    if not group & 0b10000:
+                        break
+                flat.append(version, type_id, value, 0)
+                finished = True
+            else:  # Operator
+                if read_int(1):
+                    stack.append([version, type_id, True, read_int(11), 0])
+                else:
+                    length = read_int(15)
+                    stack.append([version, type_id, False, reader.position + length, 0])
+                finished = False
+            # Add every operator whose sub-packets have now all been read
+            while stack:
+                operator = stack[-1]
+                if finished:
+                    operator[4] += 1
+                if operator[4] < operator[3] if operator[2] else reader.position < operator[3]:
+                    break
+                stack.pop()
+                flat.append(operator[0], operator[1], 0, operator[4])
+                finished = True
+            if not stack:
+                return flat
+
     @staticmethod
     def parse_file(file_name):
         with open(file_name) as f:
@@ -131,6 +289,43 @@ class PacketDecoder:
             args.append(PacketDecoder.eval(x))
         return PacketDecoder.__operators[tree['type_id']](args)
 
+    @staticmethod
+    def eval_flat(flat: FlatPacket):
+        """
+        Evaluate a parse tree from parse_flat(), without recursion. Packets are visited in order, pushing each value onto
+        a stack; an operator's arguments are the values of its sub-packets, which are on top of the stack
+        """
+        stack = []
+        for type_id, value, count in zip(flat.type_ids, flat.values, flat.child_counts):
+            if type_id == 4:
+                stack.append(value)
+                continue
+            args = stack[len(stack) - count:]
+            del stack[len(stack) - count:]
+            if type_id == 0:
+                value = sum(args)
+            elif type_id == 1:
+                value = prod(args)
+            elif type_id == 2:
+                value = min(args)
+            elif type_id == 3:
+                value = max(args)
+            elif type_id == 5:
+                value = int(args[0] > args[1])
+            elif type_id == 6:
+                value = int(args[0] < args[1])
+            elif type_id == 7:
+                value = int(args[0] == args[1])
+            else:
+                raise KeyError(type_id)
+            stack.append(value)
+        return stack[-1]
+
+    @staticmethod
+    def decode_flat(packet):
+        """Same as decode(), but using parse_flat() and eval_flat(), so there is no limit on how deeply packets nest"""
+        return PacketDecoder.eval_flat(PacketDecoder.parse_flat(packet))
+
     @staticmethod
     def decode(packet):
         parse_tree, _ = PacketDecoder.parse(packet)
@@ -140,3 +335,49 @@ class PacketDecoder:
     def decode_file(file_name):
         parse_tree, _ = PacketDecoder.parse_file(file_name)
         return PacketDecoder.eval(parse_tree[0])
+
+    # -------------------------
+    # Many transmissions
+    # -------------------------
+
+    @staticmethod
+    def decode_summary(packet) -> tuple[int, int]:
+        """
+        Decode a transmission with decode_flat()
+        :param packet: Packet as a string of hex digits. Surrounding whitespace is ignored
+        :return: tuple containing the sum of the versions of every packet in the transmission, and its value
+        """
+        flat = PacketDecoder.parse_flat(packet.strip())
+        return flat.version_sum(), PacketDecoder.eval_flat(flat)
+
+    @staticmethod
+    def decode_stream(source) -> Iterator[tuple[int, int]]:
+        """
+        Lazily decode transmissions, one per line, as they are read. Blank lines are skipped. The source may be endless
+        :param source: Path to a file, or an iterable of lines, such as an open file
+        :return: Generator of the result of decode_summary() for each transmission
+        """
+        if isinstance(source, (str, os.PathLike)):
+            with open(source) as f:
+                yield from PacketDecoder.decode_stream(f)
+            return
+        for line in source:
+            if line := line.strip():
+                yield PacketDecoder.decode_summary(line)
+
+    @staticmethod
+    def decode_batch(packets: Iterable[str], workers: int | None = None, chunk_size: int = 64) -> list[tuple[int, int]]:
+        """
+        Decode many transmissions, spread across a pool of processes
+        :param packets: Transmissions as strings of hex digits
+        :param workers: Number of processes to use. Defaults to the number of CPUs. With 1 worker, the transmissions are
+        decoded in this process
+        :param chunk_size: Number of transmissions sent to a process at a time
+        :return: List of the result of decode_summary() for each transmission, in the same order as the transmissions
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers == 1:
+            return [PacketDecoder.decode_summary(x) for x in packets]
+        with ProcessPoolExecutor(workers) as executor:
+            return list(executor.map(PacketDecoder.decode_summary, packets, chunksize=chunk_size))
@@ -0,0 +1,190 @@
+"""Tests and benchmarks for packet_decoder.py"""
+
+import os
+import random
+import tempfile
+from itertools import islice
+from timeit import timeit
+
+from option_selection import OptionSelector
+from packet_decoder import PacketDecoder
+from testing import test_bed
+
+
+# Examples from the puzzle, with the value of each
+EXAMPLES = {
+    'C200B40A82': 3,
+    '04005AC33890': 54,
+    '880086C3E88112': 7,
+    'CE00C43D881120': 9,
+    'D8005AC2A8F0': 1,
+    'F600BC2D8F': 0,
+    '9C005AC2F8F0': 0,
+    '9C0141080250320F1802104A08': 1,
+}
+
+
+def random_packet_bits(rng: random.Random, depth: int) -> str:
+    """
+    Generate the bits of a random packet
+    :param rng: Random number generator
+    :param depth: Greatest depth of operators allowed below this packet
+    :return: The packet as a string of '0's and '1's
+    """
+    header = format(rng.randrange(8), '03b')
+    if depth == 0 or rng.random() < 0.4:
+        groups = format(rng.getrandbits(rng.choice((4, 16, 40))), 'b')
+        groups = groups.zfill(-(-len(groups) // 4) * 4)
+        return header + '100' + ''.join(('1' if i + 4 < len(groups) else '0') + groups[i:i + 4]
+                                        for i in range(0, len(groups), 4))
+    type_id = rng.choice((0, 1, 2, 3, 5, 6, 7))
+    count = 2 if type_id >= 5 else rng.randint(1, 4)
+    sub_packets = ''.join(random_packet_bits(rng, depth - 1) for _ in range(count))
+    if len(sub_packets) < 2 ** 15 and rng.random() < 0.5:
+        return header + format(type_id, '03b') + '0' + format(len(sub_packets), '015b') + sub_packets
+    return header + format(type_id, '03b') + '1' + format(count, '011b') + sub_packets
+
+
+def random_transmission(packets: int, seed: int = 0) -> str:
+    """
+    Generate a random transmission: the sum of the given number of random packets, grouped into sums of at most 2047
+    packets as often as needed
+    :param packets: Number of random packets in the transmission
+    :param seed: Seed for the random number generator
+    :return: The transmission as a string of hex digits
+    """
+    rng = random.Random(seed)
+    level = [random_packet_bits(rng, 6) for _ in range(packets)]
+    while len(level) > 1 or packets == 0:
+        level = ['000' + '000' + '1' + format(len(group), '011b') + ''.join(group)
+                 for group in (level[i:i + 2047] for i in range(0, len(level), 2047))]
+        packets = 1
+    bits = level[0] + '0' * (-len(level[0]) % 8)
+    return format(int(bits, 2), f'0{len(bits) // 4}X')
+
+
+def deep_transmission(depth: int) -> str:
+    """Generate a transmission of sum operators nested depth deep, each with a single sub-packet, around a literal 1"""
+    bits = '000' '000' '1' '00000000001'
+    bits = bits * depth + '000' '100' '00001'
+    bits += '0' * (-len(bits) % 8)
+    return format(int(bits, 2), f'0{len(bits) // 4}X')
+
+
+def wide_transmission(groups: int, width: int) -> str:
+    """Generate a transmission that is the sum of groups sums, each of width literals from 0 to 15"""
+    literals = [f'000' '100' f'0{x:04b}' for x in range(16)]
+    group = '000' '000' '1' + format(width, '011b') + ''.join(literals[i % 16] for i in range(width))
+    bits = '000' '000' '1' + format(groups, '011b') + group * groups
+    bits += '0' * (-len(bits) % 8)
+    return format(int(bits, 2), f'0{len(bits) // 4}X')
+
+
+def version_sum(tree) -> int:
+    return tree['version'] + sum(version_sum(x) for x in tree.get('sub-packets', ()))
+
+
+def test_parse():
+    """
+    Check decode() against the examples, and parse() against parse_by_slicing() on the examples and random
+    transmissions
+    """
+    test_bed(PacketDecoder.decode, list(EXAMPLES), list(EXAMPLES.values()))
+    packets = list(EXAMPLES) + ['8A004A801A8002F478', '620080001611562C8802118E34'] + \
+        [random_transmission(count, seed) for seed, count in enumerate((1, 1, 5, 20, 60))]
+    test_bed(PacketDecoder.parse, packets, [PacketDecoder.parse_by_slicing(x) for x in packets])
+    assert version_sum(PacketDecoder.parse('8A004A801A8002F478')[0][0]) == 16
+
+
+def test_decode_flat():
+    """Check decode_flat() and the version sums of parse_flat() against decode() and parse()"""
+    packets = list(EXAMPLES) + ['8A004A801A8002F478', '620080001611562C8802118E34', deep_transmission(50),
+                                wide_transmission(3, 40)] + \
+        [random_transmission(count, seed) for seed, count in enumerate((1, 1, 5, 20, 60, 500))]
+    test_bed(lambda x: (PacketDecoder.decode_flat(x), PacketDecoder.parse_flat(x).version_sum()), packets,
+             [(PacketDecoder.decode(x), version_sum(PacketDecoder.parse(x)[0][0])) for x in packets])
+    assert PacketDecoder.decode_flat(deep_transmission(10 ** 5)) == 1
+    assert PacketDecoder.decode_flat(wide_transmission(2047, 2047)) == 2047 * sum(i % 16 for i in range(2047))
+
+
+def test_decode_stream():
+    """Check decode_stream() and decode_batch() against decode() on a file of transmissions"""
+    packets = list(EXAMPLES) + [random_transmission(count, seed) for seed, count in enumerate((1, 2, 3, 5, 8) * 20)]
+    expected = [(version_sum(PacketDecoder.parse(x)[0][0]), PacketDecoder.decode(x)) for x in packets]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'transmissions.txt')
+        with open(path, 'w') as f:
+            f.write('\n'.join(packets) + '\n\n')
+        test_bed(lambda x: list(PacketDecoder.decode_stream(x)), [path], [expected])
+    # An endless stream, cycling through the transmissions
+    endless = (packets[i % len(packets)] for i in range(10 ** 18))
+    assert list(islice(PacketDecoder.decode_stream(endless), 2 * len(packets))) == expected * 2
+    test_bed(lambda workers: PacketDecoder.decode_batch(packets, workers, 7), [1, 2, 3], [expected] * 3)
+
+
+def benchmark_parse():
+    """Compare parse() with parse_by_slicing() on random transmissions of increasing size"""
+    print(f'{"packets":>8} {"size (KiB)":>10} {"parser":>16} {"time (s)":>10}')
+    for packets in (100, 1000, 3000, 10000, 30000):
+        packet = random_transmission(packets)
+        parsers = {'parse': PacketDecoder.parse}
+        if packets <= 3000:
+            parsers['parse_by_slicing'] = PacketDecoder.parse_by_slicing
+        for name, parse in parsers.items():
+            time = timeit(lambda: parse(packet), number=1)
+            print(f'{packets:>8} {len(packet) / 2 ** 10:>10.1f} {name:>16} {time:>10.4f}')
+
+
+def benchmark_decode_flat():
+    """Compare decode() with decode_flat() on deep, wide and random transmissions"""
+    print(f'{"transmission":>22} {"size (KiB)":>10} {"decoder":>12} {"time (s)":>10}')
+    transmissions = {
+        'deep (depth 500)': deep_transmission(500),
+        'deep (depth 10^5)': deep_transmission(10 ** 5),
+        'deep (depth 10^6)': deep_transmission(10 ** 6),
+        'wide (2047 x 200)': wide_transmission(2047, 200),
+        'wide (2047 x 2047)': wide_transmission(2047, 2047),
+        'random (30000)': random_transmission(30000),
+    }
+    for name, packet in transmissions.items():
+        for decoder in ('decode', 'decode_flat'):
+            try:
+                time = f'{timeit(lambda: getattr(PacketDecoder, decoder)(packet), number=1):>10.4f}'
+            except RecursionError:
+                time = f'{"recursion":>10}'
+            print(f'{name:>22} {len(packet) / 2 ** 10:>10.1f} {decoder:>12} {time}')
+
+
+def benchmark_decode_batch():
+    """Compare decoding a file of transmissions as a stream with decoding it in batches across pools of processes"""
+    cpus = os.cpu_count() or 1
+    print(f'{cpus} CPU(s) available')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'transmissions.txt')
+        packets = [random_transmission(5, seed) for seed in range(5000)]
+        with open(path, 'w') as f:
+            f.write('\n'.join(packets))
+        print(f'{len(packets)} transmissions, {os.path.getsize(path) / 2 ** 20:.1f} MiB')
+        methods = {'decode_stream': lambda: sum(1 for _ in PacketDecoder.decode_stream(path))}
+        for workers in sorted({1, 2, 4, cpus}):
+            methods[f'decode_batch ({workers} worker(s))'] = \
+                lambda workers=workers: PacketDecoder.decode_batch(packets, workers)
+        for name, run in methods.items():
+            time = timeit(run, number=1)
+            print(f'  {name:>30} {time:>8.4f} s {len(packets) / time:>8.0f} transmissions/s')
+
+
+def main():
+    print('Packet decoder')
+    selector = OptionSelector()
+    selector.add_option('t', 'test parse', test_parse)
+    selector.add_option('tf', 'test flat parse and evaluation', test_decode_flat)
+    selector.add_option('ts', 'test streaming and batch decoding', test_decode_stream)
+    selector.add_option('b', 'benchmark parse', benchmark_parse)
+    selector.add_option('bf', 'benchmark flat parse and evaluation', benchmark_decode_flat)
+    selector.add_option('bb', 'benchmark streaming and batch decoding', benchmark_decode_batch)
+    selector.run()
+
+
+if __name__ == '__main__':
+    main()
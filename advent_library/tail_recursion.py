@@ -1,5 +1,7 @@
 """Tail recursion decorator. Created by Chris Penner."""
 
+from functools import lru_cache, wraps
+
 
 class Recurse(Exception):
     def __init__(self, *args, **kwargs):
@@ -11,14 +13,53 @@ def recurse(*args, **kwargs):
     raise Recurse(*args, **kwargs)
 
 
+class TailCall:
+    """Returned by a function decorated with tail_recursive() to call itself again with new arguments"""
+    __slots__ = ('args', 'kwargs')
+
+    def __init__(self, args, kwargs):
+        self.args = args
+        self.kwargs = kwargs
+
+
+def tail_call(*args, **kwargs):
+    """
+    Make a tail call from a function decorated with tail_recursive(), by returning the result: return tail_call(...).
+    Unlike recurse(), this does not raise an exception, which is much faster
+    """
+    return TailCall(args, kwargs)
+
+
 def tail_recursive(f):
+    """
+    Run a function in a loop instead of letting it recurse. The function makes a tail call to itself by returning
+    tail_call() with the new arguments, or by calling recurse() with them
+    """
+    @wraps(f)
     def decorated(*args, **kwargs):
         while True:
             try:
-                return f(*args, **kwargs)
+                result = f(*args, **kwargs)
             except Recurse as r:
                 args = r.args
                 kwargs = r.kwargs
                 continue
+            if type(result) is not TailCall:
+                return result
+            args = result.args
+            kwargs = result.kwargs
 
     return decorated
+
+
+def memoized(f=None, *, maxsize: int | None = 128):
+    """
+    Cache the results of a function, keeping the results of the maxsize most recently used arguments. Can be used as
+    @memoized or @memoized(maxsize=...). The decorated function's cache_info() gives the cache hits, misses, maximum size
+    and current size, and cache_clear() empties the cache. Arguments must be hashable
+    :param f: Function to decorate
+    :param maxsize: Number of results to keep. If None, the cache is unbounded
+    """
+    if f is None:
+        return lru_cache(maxsize)
+    return lru_cache(maxsize)(f)
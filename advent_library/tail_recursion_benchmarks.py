@@ -0,0 +1,96 @@
+"""Tests and benchmarks for tail_recursion.py"""
+
+from timeit import timeit
+
+from option_selection import OptionSelector
+from tail_recursion import memoized, recurse, tail_call, tail_recursive
+from testing import test_bed
+
+
+@tail_recursive
+def sum_with_recurse(n: int, total: int = 0) -> int:
+    if n == 0:
+        return total
+    recurse(n - 1, total=total + n)
+
+
+@tail_recursive
+def sum_with_tail_call(n: int, total: int = 0) -> int:
+    if n == 0:
+        return total
+    return tail_call(n - 1, total=total + n)
+
+
+@tail_recursive
+def sum_mixed(n: int, total: int = 0) -> int:
+    """Alternate between both kinds of tail call"""
+    if n == 0:
+        return total
+    if n % 2:
+        recurse(n - 1, total + n)
+    return tail_call(n - 1, total=total + n)
+
+
+def sum_with_loop(n: int) -> int:
+    total = 0
+    while n:
+        total += n
+        n -= 1
+    return total
+
+
+def test_tail_recursive():
+    inputs = [0, 1, 10, 1000, 10 ** 5]
+    expected = [n * (n + 1) // 2 for n in inputs]
+    for function in (sum_with_recurse, sum_with_tail_call, sum_mixed):
+        print(f'Function: {function.__name__}')
+        test_bed(function, inputs, expected)
+
+
+def test_memoized():
+    calls = []
+
+    @memoized(maxsize=2)
+    def square(x: int) -> int:
+        calls.append(x)
+        return x * x
+
+    # 3 is evicted when 4 is added, since 2 was used more recently
+    results = [square(x) for x in (2, 3, 2, 4, 3, 2)]
+    info = square.cache_info()
+    test_bed(lambda: (results, calls, info.hits, info.misses, info.currsize), [()],
+             [([4, 9, 4, 16, 9, 4], [2, 3, 4, 3, 2], 1, 5, 2)])
+
+    @memoized
+    def fibonacci(n: int) -> int:
+        return n if n < 2 else fibonacci(n - 1) + fibonacci(n - 2)
+
+    test_bed(fibonacci, [90], [2880067194370816120])
+
+
+def benchmark_tail_recursion():
+    """Compare the two kinds of tail call with a loop. Plain recursion is left out, since it cannot go 10^3 deep"""
+    print(f'{"depth":>9} {"method":>13} {"time (s)":>10} {"ns per call":>12}')
+    methods = {
+        'recurse()': sum_with_recurse,
+        'tail_call()': sum_with_tail_call,
+        'loop': sum_with_loop,
+    }
+    for exponent in range(3, 8):
+        depth = 10 ** exponent
+        for name, function in methods.items():
+            time = timeit(lambda: function(depth), number=1)
+            print(f'{f"10^{exponent}":>9} {name:>13} {time:>10.4f} {time / depth * 1e9:>12.1f}')
+
+
+def main():
+    print('Tail recursion')
+    selector = OptionSelector()
+    selector.add_option('tt', 'test tail_recursive', test_tail_recursive)
+    selector.add_option('tm', 'test memoized', test_memoized)
+    selector.add_option('b', 'benchmark tail calls', benchmark_tail_recursion)
+    selector.run()
+
+
+if __name__ == '__main__':
+    main()